@@ -1,14 +1,27 @@
 
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 import backend
+import asyncio
 import os
+import json
 import shutil
 import tempfile
 from typing import Optional
 
-app = FastAPI(title="College Architect API")
+WARMUP_ON_BOOT = os.environ.get("WARMUP_ON_BOOT", "on").lower() == "on"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the embedding model, Chroma and brain_config before serving traffic."""
+    if WARMUP_ON_BOOT:
+        await asyncio.to_thread(backend.warm_up)
+    yield
+
+app = FastAPI(title="College Architect API", lifespan=lifespan)
 
 # Enable CORS for Next.js frontend
 app.add_middleware(
@@ -30,6 +43,8 @@ class UserProfile(BaseModel):
 
 class GenerateRequest(BaseModel):
     profile: UserProfile
+    # Parallel drafts to pick from (default: BEST_OF_N); /generate only
+    best_of: Optional[int] = Field(None, ge=1, le=backend.BEST_OF_MAX)
 
 # --- Endpoints ---
 
@@ -37,6 +52,14 @@ class GenerateRequest(BaseModel):
 def health_check():
     return {"status": "ok", "service": "College Architect API"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 once warm-up has finished cleanly, 503 until then (or if a step failed)."""
+    state = backend.get_warmup_state()
+    if not WARMUP_ON_BOOT:
+        state["ready"] = True
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
 @app.get("/")
 def root():
     return {"message": "College Architect Brain is Active 🧠", "docs": "/docs"}
@@ -50,6 +73,20 @@ def get_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/perf")
+def get_perf():
+    """Returns runtime performance counters (connection pool reuse, etc.)."""
+    return {
+        "gemini_pool": backend.gemini_client.get_pool_stats(),
+        "rate_limiter": backend.rate_limiter.get_limiter().get_stats(),
+        "generation_cache": backend.generation_cache.get_cache().get_stats(),
+        "embedding_cache": backend.embedding_cache.get_cache().get_stats(),
+        "retrieval_cache": backend.retrieval_cache.get_cache().get_stats(),
+        "single_flight": backend.single_flight.get_single_flight().get_stats(),
+        "generation_prompt": backend.get_prompt_stats(),
+        "hedging": backend.get_hedging_stats(),
+    }
+
 @app.post("/analyze")
 def trigger_analysis():
     """Triggers global corpus analysis."""
@@ -61,44 +98,45 @@ def trigger_analysis():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_profile_string(profile: UserProfile) -> str:
+    """Flattens the wizard profile into the prompt string (matching app.py logic)."""
+    cv_section = f"\nCV/Resume Details: {profile.cv_text[:2000]}" if profile.cv_text else ""
+    
+    return f"""
+        Target Course: {profile.target_course}
+        Motivation: {profile.motivation}
+        Super-Curriculars: {profile.super_curriculars}
+        Work Experience: {profile.work_experience}{cv_section}
+        """
+
+def retrieve_exemplars(profile: UserProfile) -> str:
+    """Stage 2 retrieval: best-matched exemplar chunks for this student."""
+    essay_count = backend.get_essay_count()
+    if essay_count == 0:
+        raise HTTPException(status_code=400, detail="Brain is empty. Please upload essays first.")
+
+    # Stage 2 Retrieval (Targeted), packed into the exemplar token budget
+    search_query = f"{profile.target_course} {profile.motivation[:500]}"
+    retrieved_exemplars, _ = backend.retrieve_exemplars(search_query, max_chunks=5, target_course=profile.target_course)
+    return retrieved_exemplars
+
 @app.post("/generate")
 def generate_essay(req: GenerateRequest):
     """Generates an essay using the Phoenix engine."""
     try:
-        # 1. Construct User Profile String (matching app.py logic)
-        cv_section = f"\nCV/Resume Details: {req.profile.cv_text[:2000]}" if req.profile.cv_text else ""
-        
-        full_profile_str = f"""
-        Target Course: {req.profile.target_course}
-        Motivation: {req.profile.motivation}
-        Super-Curriculars: {req.profile.super_curriculars}
-        Work Experience: {req.profile.work_experience}{cv_section}
-        """
+        # 1. Construct User Profile String
+        full_profile_str = build_profile_string(req.profile)
 
         # 2. Retrieve Exemplars (Backend Logic)
-        vectorstore = backend.get_vectorstore()
-        
-        # Broad Search first
-        # Note: We can't easily access the vectorstore count directly here without backend help, 
-        # but backend.get_vectorstore() returns the object.
-        # Let's rely on backend logic or replicate it slightly.
-        # Ideally, move the retrieval logic into a clean function in backend.py, 
-        # but for now we will implement the logic here to match app.py's flow.
-        
-        essay_count = backend.get_essay_count()
-        if essay_count == 0:
-            raise HTTPException(status_code=400, detail="Brain is empty. Please upload essays first.")
-
-        # Stage 2 Retrieval (Targeted)
-        search_query = f"{req.profile.target_course} {req.profile.motivation[:500]}"
-        best_exemplars = vectorstore.similarity_search(search_query, k=5)
-        retrieved_exemplars = "\n\n---EXEMPLAR---\n\n".join([doc.page_content for doc in best_exemplars])
+        retrieved_exemplars = retrieve_exemplars(req.profile)
 
         # 3. Load Config
         brain_config = backend.load_brain_config() or {}
 
         # 4. Generate
-        result_json = backend.generate_separated_essay(full_profile_str, retrieved_exemplars, brain_config)
+        result_json = backend.generate_separated_essay(
+            full_profile_str, retrieved_exemplars, brain_config, best_of=req.best_of
+        )
         
         if "error" in result_json:
             raise HTTPException(status_code=500, detail=result_json["error"])
@@ -109,9 +147,47 @@ def generate_essay(req: GenerateRequest):
         print(f"API Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: dict) -> str:
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate/stream")
+def generate_essay_stream(req: GenerateRequest):
+    """
+    Streaming variant of /generate (Server-Sent Events).
+    Emits retrieval_done, drafting, section_delta, grammar_pass, quality_gate
+    and finally result (same payload as /generate) or error. gate_abort means
+    the draft so far was dropped early and a new drafting attempt follows.
+    Streams a single draft, so best_of > 1 is rejected with 400.
+    """
+    if req.best_of is not None and req.best_of > 1:
+        raise HTTPException(status_code=400, detail="best_of is not supported by /generate/stream; use /generate")
+
+    def event_stream():
+        try:
+            full_profile_str = build_profile_string(req.profile)
+            retrieved_exemplars = retrieve_exemplars(req.profile)
+            yield sse_event("retrieval_done", {"exemplar_chars": len(retrieved_exemplars)})
+
+            brain_config = backend.load_brain_config() or {}
+            for event in backend.generate_separated_essay_stream(full_profile_str, retrieved_exemplars, brain_config):
+                name = event.pop("event")
+                yield sse_event(name, event)
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            print(f"API Error: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/ingest")
 async def ingest_file(file: UploadFile = File(...)):
-    """Ingests a PDF or DOCX file into the brain."""
+    """Ingests a PDF, DOCX or synthetic-essay TXT file into the brain."""
     try:
         # Create 'pdfs' dir if not exists (backend expects it usually, or we just need temp)
         if not os.path.exists("pdfs"):
@@ -173,7 +173,7 @@ if app_mode == "⚙️ Admin: Train Brain":
     
     # Upload Section
     st.subheader("📤 Upload Essays")
-    uploaded_files = st.file_uploader("Upload PDF or Word Essays", type=["pdf", "docx"], accept_multiple_files=True)
+    uploaded_files = st.file_uploader("Upload PDF or Word Essays (or synthetic .txt essays)", type=["pdf", "docx", "txt"], accept_multiple_files=True)
     
     if st.button("Process & Save to Brain"):
         if uploaded_files:
@@ -427,7 +427,6 @@ elif app_mode == "🎓 UCAS Personal Statement":
                     """
                     
                     # 2. STAGE 1: Retrieve ALL essays from the brain (corpus analysis)
-                    vectorstore = backend.get_vectorstore()
                     essay_count = backend.get_essay_count()
                     
                     # CRITICAL: Check if brain is empty BEFORE searching
@@ -436,15 +435,17 @@ elif app_mode == "🎓 UCAS Personal Statement":
                         st.stop()
                     
                     # Get a broad sample first (up to 50 chunks to show "Whole Brain" analysis)
-                    all_essays = vectorstore.similarity_search("personal statement motivation academic", k=min(essay_count, 50))
+                    # Cached until the next ingest; the query never changes
+                    all_essays = backend.search_chunks("personal statement motivation academic", k=min(essay_count, 50))
                     corpus_text = "\n\n".join([doc.page_content for doc in all_essays])
                     
                     # 3. STAGE 2: Get the BEST exemplars matched to THIS student's profile
                     # Combine course + motivation for targeted retrieval
                     search_query = f"{st.session_state.target_course} {st.session_state.student_story[:500]}"
                     # PERFORMANCE UPDATE: User requested k=3 for precise style transfer.
-                    best_exemplars = vectorstore.similarity_search(search_query, k=min(essay_count, 3))
-                    retrieved_exemplars = "\n\n---EXEMPLAR---\n\n".join([doc.page_content for doc in best_exemplars])
+                    # Packed into the exemplar token budget so prompt size stays predictable.
+                    retrieved_exemplars, pack_info = backend.retrieve_exemplars(
+                        search_query, max_chunks=3, target_course=st.session_state.target_course)
                     
                     # 4. Load Brain Config (Rules)
                     brain_config = backend.load_brain_config() or {}
@@ -452,7 +453,7 @@ elif app_mode == "🎓 UCAS Personal Statement":
                     # 5. DEBUG: Show what the AI is reading
                     with st.expander("🧠 See what the AI is reading (Style Bible)"):
                         st.info(f"**Stage 1:** Analyzed {len(all_essays)} chunks ({len(corpus_text)} chars) from entire corpus")
-                        st.info(f"**Stage 2:** Selected {len(best_exemplars)} best-matched exemplars ({len(retrieved_exemplars)} chars)")
+                        st.info(f"**Stage 2:** Selected {pack_info['chunks']} best-matched exemplars ({len(retrieved_exemplars)} chars, ~{pack_info['tokens_est']} tokens)")
                         if len(retrieved_exemplars) < 50:
                             st.error("⚠️ WARNING: No text retrieved! Upload essays to Admin first.")
                         else:
@@ -505,11 +506,21 @@ elif app_mode == "🎓 UCAS Personal Statement":
             st.success("✅ Drafting Complete! Phoenix Engine Active.")
             
             # --- QUALITY GATE CHECK ---
-            passed, issues, score = backend.quality_gate(f"{q1}\n{q2}\n{q3}")
+            # Same gate (with the brain's banned terms) the backend scored and repaired against
+            gate_config = backend.load_brain_config() or {}
+            passed, issues, score = backend.quality_gate(f"{q1}\n{q2}\n{q3}", gate_config)
             if not passed:
                 st.error(f"⚠️ **AI DETECTOR WARNING (Score: {score}/100)**: logic detected robotic patterns.")
                 for issue in issues:
                     st.warning(f"• {issue}")
+                if backend.section_issues(result_json, gate_config):
+                    if st.button("🔧 Repair Flagged Sections"):
+                        with st.spinner("Rewriting only the flagged sections..."):
+                            repair_config = backend.load_brain_config() or {}
+                            result_json["_local_repair"] = backend.local_repair(result_json, repair_config)
+                            result_json["_repair"] = backend.repair_sections(result_json, repair_config)
+                        st.session_state.generated_essay_json = result_json
+                        st.rerun()
             else:
                 st.info(f"🛡️ **Antigravity Quality Check Passed** (Score: {score}/100)")
             # ---------------------------
@@ -19,42 +19,85 @@ except:
 
 print(f"DEBUG: GEMINI_API_KEY is {'SET' if os.getenv('GEMINI_API_KEY') else 'NOT SET'}")
 
-from google import genai
 from google.genai import types
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
 from ingest_essays import load_pdfs, split_text, store_in_chroma
+import gemini_client
+import rate_limiter
+import generation_cache
+import embedding_cache
+import embedding_models
+import single_flight
+import prompt_compiler
+import retrieval
+import hedging
+import grammar_local
+import phrase_matcher
+import phrase_repair
+import length_fitter
+import stylometry
+import numpy_index
+import lexical_index
+import retrieval_cache
+import corpus_tags
+from gemini_client import DEFAULT_MODEL, GRAMMAR_MODEL
 
 import chromadb
 from chromadb.config import Settings
 import time
 import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # ============================================================================
 # SAFE GENERATE CONTENT - Rate Limit Protection
 # ============================================================================
-def safe_generate_content(client, contents, model="gemini-3-flash-preview", config=None):
+def safe_generate_content(client, contents, model=DEFAULT_MODEL, config=None, max_retries=5):
     """
-    Wrapper for client.models.generate_content with strict 429 backoff.
+    Wrapper for client.models.generate_content with shared rate limiting.
+    Calls are admitted by the cross-process token bucket first; a 429 triggers
+    jittered exponential backoff that honors any retry-after hint.
+    When GENERATION_CACHE is enabled, identical calls are served from disk.
     """
+    cache = generation_cache.get_cache()
+    cache_key = None
+    if cache.enabled:
+        cache_key = generation_cache.make_key(
+            "safe_generate_content", contents, model=model,
+            config=generation_cache.config_fingerprint(config)
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return generation_cache.CachedResponse(cached)
+    
+    limiter = rate_limiter.get_limiter()
+    estimated_tokens = rate_limiter.estimate_tokens(contents, config)
     retry_count = 0
-    max_retries = 5
     
     while retry_count < max_retries:
+        limiter.acquire(model, estimated_tokens)
         try:
             response = client.models.generate_content(
                 model=model,
                 contents=contents,
                 config=config
             )
+            usage = getattr(response, "usage_metadata", None)
+            actual_tokens = getattr(usage, "total_token_count", None)
+            if actual_tokens:
+                limiter.adjust_tokens(model, actual_tokens - estimated_tokens)
+            if cache_key and response.text:
+                cache.put(cache_key, response.text)
             return response
         except Exception as e:
             # Check for rate limit in various ways depending on SDK error structure
             e_str = str(e).lower()
             if "429" in e_str or "quota" in e_str or "resource_exhausted" in e_str:
-                wait_time = 10 + random.uniform(1, 5)
+                wait_time = rate_limiter.backoff_delay(retry_count, rate_limiter.retry_after_hint(e))
                 print(f"⚠ Rate Limit Hit (429). Cooling down for {wait_time:.1f}s...")
-                time.sleep(wait_time)
+                limiter.throttle(model, wait_time)
                 retry_count += 1
             else:
                 # Re-raise other errors
@@ -62,6 +105,145 @@ def safe_generate_content(client, contents, model="gemini-3-flash-preview", conf
     
     raise Exception("Max retries exceeded for safe_generate_content")
 
+def safe_generate_content_stream(client, contents, model=DEFAULT_MODEL, config=None, max_retries=5):
+    """
+    Streaming counterpart of safe_generate_content: yields the response chunks.
+    Same token-bucket admission and 429 backoff; a rate-limited call is only
+    retried before its first chunk (after that the caller has already shown text).
+    Closing the generator closes the underlying stream.
+    """
+    limiter = rate_limiter.get_limiter()
+    estimated_tokens = rate_limiter.estimate_tokens(contents, config)
+    
+    for retry_count in range(max_retries):
+        limiter.acquire(model, estimated_tokens)
+        stream = None
+        started = False
+        try:
+            stream = client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config
+            )
+            usage = None
+            for chunk in stream:
+                started = True
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                yield chunk
+            actual_tokens = getattr(usage, "total_token_count", None)
+            if actual_tokens:
+                limiter.adjust_tokens(model, actual_tokens - estimated_tokens)
+            return
+        except Exception as e:
+            e_str = str(e).lower()
+            if not ("429" in e_str or "quota" in e_str or "resource_exhausted" in e_str):
+                raise
+            wait_time = rate_limiter.backoff_delay(retry_count, rate_limiter.retry_after_hint(e))
+            print(f"⚠ Rate Limit Hit (429). Cooling down for {wait_time:.1f}s...")
+            limiter.throttle(model, wait_time)
+            if started:
+                raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+    
+    raise Exception("Max retries exceeded for safe_generate_content_stream")
+
+
+# ============================================================================
+# GRAMMAR PASS - Concurrent per-section correction
+# ============================================================================
+SECTION_KEYS = ["q1_answer", "q2_answer", "q3_answer"]
+GRAMMAR_TIMEOUT_SECONDS = float(os.environ.get("GRAMMAR_TIMEOUT_SECONDS", "20"))
+
+# Shared pool so a timed-out section never blocks the request on shutdown
+_grammar_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("GRAMMAR_WORKERS", "12")),
+                                   thread_name_prefix="grammar")
+
+GRAMMAR_ENGINE = os.environ.get("GRAMMAR_ENGINE", "llm").lower()  # "llm", "local" or "hybrid"
+
+def llm_grammar_check(text, client):
+    """Fix grammar/spelling in one section with the LLM. Returns the original text on any failure."""
+    try:
+        grammar_response = safe_generate_content(
+            client,
+            model=GRAMMAR_MODEL,
+            contents=f"""Fix ONLY grammar and spelling errors in this text. 
+Do NOT change the meaning, style, or add any new content.
+Return ONLY the corrected text, nothing else.
+
+Text: {text}""",
+            config=gemini_client.build_config(GRAMMAR_MODEL),
+            max_retries=1
+        )
+        return grammar_response.text.strip()
+    except:
+        return text  # Return original if grammar check fails
+
+def grammar_check_detail(text, client, engine=None):
+    """
+    Grammar pass for one section with the configured engine:
+      llm    - GRAMMAR_MODEL rewrites every section
+      local  - in-process rules only (grammar_local), no network
+      hybrid - local first; escalates to the LLM when the local pass made too
+               many edits or found unknown words
+    Returns (text, info) where info records the engine that produced the text.
+    """
+    engine = engine or GRAMMAR_ENGINE
+    if not text or len(text) < 50:
+        return text, {"engine": "skip"}
+    if engine == "llm":
+        return llm_grammar_check(text, client), {"engine": "llm"}
+    corrected, local_info = grammar_local.get_corrector().correct(text)
+    info = {"engine": "local", "edits": len(local_info["edits"]), "unknown_words": len(local_info["unknown_words"])}
+    if engine == "hybrid" and local_info["escalate"]:
+        info["engine"] = "llm"
+        return llm_grammar_check(corrected, client), info
+    return corrected, info
+
+def grammar_check(text, client):
+    """Fix grammar/spelling in one section. Returns the original text on any failure."""
+    return grammar_check_detail(text, client)[0]
+
+def grammar_check_sections(result, client, timeout=None):
+    """
+    Runs grammar_check on q1/q2/q3 concurrently. Any section that has not
+    finished within `timeout` seconds keeps its uncorrected text.
+    Returns a timings dict for the stage.
+    """
+    timeout = GRAMMAR_TIMEOUT_SECONDS if timeout is None else timeout
+    stage_start = time.perf_counter()
+
+    def timed_check(key):
+        start = time.perf_counter()
+        corrected, info = grammar_check_detail(result.get(key, ""), client)
+        return corrected, info, time.perf_counter() - start
+
+    futures = {key: _grammar_pool.submit(timed_check, key) for key in SECTION_KEYS}
+    wait(futures.values(), timeout=timeout)
+
+    section_seconds = {}
+    engines = {}
+    timed_out = []
+    for key, future in futures.items():
+        if future.done() and not future.exception():
+            result[key], info, elapsed = future.result()
+            section_seconds[key] = round(elapsed, 3)
+            engines[key] = info["engine"]
+        else:
+            future.cancel()
+            timed_out.append(key)
+
+    wall = time.perf_counter() - stage_start
+    return {
+        "grammar_wall_s": round(wall, 3),
+        "grammar_sequential_s": round(sum(section_seconds.values()), 3),
+        "grammar_sections_s": section_seconds,
+        "grammar_engines": engines,
+        "grammar_timeouts": timed_out,
+    }
+
 
 # ============================================================================
 # ANTIGRAVITY STYLE CONSTANTS
@@ -77,18 +259,49 @@ BANNED_WORDS = [
     "profound", "invaluable", "wholeheartedly"
 ]
 
-def generate_separated_essay(user_profile: str, retrieved_exemplars: str, brain_config: dict) -> dict:
-    """ 
-    Phoenix 5.0: THE HUMANIZER PROTOCOL.
-    """
-    
-    api_key = os.environ.get("GEMINI_API_KEY")
-    client = genai.Client(api_key=api_key)
-    
-    # DEFENSIVE: Ensure brain_config is a dict
-    if not isinstance(brain_config, dict):
-        brain_config = {}
-    
+GENERATION_TEMPERATURE = 1.0  # Controlled creativity - stay close to exemplar style
+GENERATION_THINKING_BUDGET = 16000
+
+GENERATION_CONTENTS = "Execute SCORCHED EARTH. Be Concrete. Be Boring. No Poetry."
+
+GENERATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "analysis_log": {"type": "STRING", "description": "Confirm you deleted all metaphors."},
+        "q1_answer": {"type": "STRING", "description": "Hook (Concrete)"},
+        "q2_answer": {"type": "STRING", "description": "Academics (Argumentative)"},
+        "q3_answer": {"type": "STRING", "description": "Activities (Direct)"}
+    },
+    "required": ["analysis_log", "q1_answer", "q2_answer", "q3_answer"]
+}
+
+# User-specific complaints (driven to, etc.) collected from counselor feedback
+USER_COMPLAINTS = ["driven to", "underpinning", "instilled", "akin to", "demystify", "power of", 
+                   "drawn to", "allure", "fascinated", "deeply", "profoundly", "framework", 
+                   "landscape", "tapestry", "utilize", "leverage", "captivated", "glimpsing", 
+                   "revealing", "precise logic", "steered my interest", "forms the core",
+                   "presents a compelling", "my ambition is", "felt like discerning", "burgeoning",
+                   "illuminated", "inherent irrationality", "bedrock assumptions", "dual perspective",
+                   "forms the core of my motivation", "revelation steered", "beyond mere", "intricate calculus",
+                   "decode", "propelling", "intersection of"]
+
+ESSAY_TARGET_CHARS = 3900  # Safe target under 4000
+UCAS_LIMIT_CHARS = 4000
+UCAS_MIN_CHARS = 3000  # the quality gate's "Too short" floor
+
+def section_targets(brain_config: dict):
+    """Target characters per section, split by the brain's Structure_Blueprint."""
+    # Load blueprint or default to standard structure if missing
+    blueprint = brain_config.get("Structure_Blueprint", {}) if isinstance(brain_config, dict) else {}
+    if not isinstance(blueprint, dict):
+        blueprint = {}
+    defaults = {"q1_answer": ("Q1_percentage", 20), "q2_answer": ("Q2_percentage", 40),
+                "q3_answer": ("Q3_percentage", 40)}
+    return {key: int(ESSAY_TARGET_CHARS * (blueprint.get(name, default) / 100))
+            for key, (name, default) in defaults.items()}
+
+def anti_pattern_terms(brain_config: dict):
+    """Banned terms from brain_config Anti_Patterns ("term -> replacement" entries give the term)."""
     # DEFENSIVE: Handle Anti_Patterns schema mismatch (List vs Dict)
     anti_patterns = brain_config.get("Anti_Patterns", [])
     banned = []
@@ -96,45 +309,30 @@ def generate_separated_essay(user_profile: str, retrieved_exemplars: str, brain_
         banned = anti_patterns
     elif isinstance(anti_patterns, dict):
         banned = anti_patterns.get("Banned_Words", [])
+    return [phrase_repair.split_anti_pattern(b)[0] for b in banned if isinstance(b, str)]
+
+def _generation_prompt_template(brain_config: dict):
+    """
+    Renders the config-dependent part of the Phoenix prompt once per brain_config
+    version. Returns (template, master_banned); the template has slots for the
+    exemplars and the student profile.
+    """
+    banned = anti_pattern_terms(brain_config)
     
     # CRITICAL: Merge all banned lists into one Master List
     # 1. Hardcoded Words (Generic AI)
     # 2. Hardcoded Phrases (Clichés)
     # 3. Dynamic Anti-Patterns (from Brain Config)
     # 4. User-Specific Complaints (driven to, etc.)
-    
-    user_complaints = ["driven to", "underpinning", "instilled", "akin to", "demystify", "power of", 
-                       "drawn to", "allure", "fascinated", "deeply", "profoundly", "framework", 
-                       "landscape", "tapestry", "utilize", "leverage", "captivated", "glimpsing", 
-                       "eager", "revealing", "precise logic", "steered my interest", "forms the core",
-                       "presents a compelling", "my ambition is", "felt like discerning", "burgeoning",
-                       "illuminated", "inherent irrationality", "bedrock assumptions", "dual perspective",
-                       "forms the core of my motivation", "revelation steered", "beyond mere", "intricate calculus",
-                       "decode", "propelling", "intersection of"]
-                       
-    master_banned = list(set(BANNED_WORDS + BANNED_PHRASES + banned + user_complaints))
-    
-    # VOCAB INJECTION: force the model to use the student's unique words
-    vocab_bank = brain_config.get('Vocabulary_Bank', [])
-    sentence_templates = brain_config.get('Sentence_Templates', [])
-    
-    forced_vocab = []
-    if len(vocab_bank) >= 7:
-        forced_vocab = random.sample(vocab_bank, 7) 
-    else:
-        forced_vocab = vocab_bank # Use all if less than 7
+    master_banned = sorted(set(BANNED_WORDS + BANNED_PHRASES + banned + USER_COMPLAINTS))
 
     # DYNAMIC STRUCTURE LOGIC
-    # Load blueprint or default to standard structure if missing
-    blueprint = brain_config.get("Structure_Blueprint", {})
-    q1_pct = blueprint.get("Q1_percentage", 20) / 100
-    q2_pct = blueprint.get("Q2_percentage", 40) / 100
-    q3_pct = blueprint.get("Q3_percentage", 40) / 100
-    
-    total_target = 3900 # Safe target under 4000
-    q1_limit = int(total_target * q1_pct)
-    q2_limit = int(total_target * q2_pct)
-    q3_limit = int(total_target * q3_pct)
+    targets = section_targets(brain_config)
+    q1_limit, q2_limit, q3_limit = (targets[key] for key in SECTION_KEYS)
+
+    # Per-request text is spliced into these slots by the compiled prompt
+    retrieved_exemplars = prompt_compiler.slot("exemplars")
+    user_profile = prompt_compiler.slot("profile")
 
     # THE 'STYLE CLONE' PROMPT (Phoenix 10.0: EXACT COPY)
     # Forces AI to clone the EXACT style of uploaded essays
@@ -222,91 +420,753 @@ OUTPUT FORMAT:
 Return JSON with keys: "analysis_log", "q1_answer", "q2_answer", "q3_answer"
 """
 
-    try:
-        # Blueprint 7.0: SCORCHED EARTH - High Temp for Chaos
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview", 
-            contents="Execute SCORCHED EARTH. Be Concrete. Be Boring. No Poetry.",
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                thinking_config=types.ThinkingConfig(
-                    include_thoughts=False,
-                    thinking_budget=16000 
-                ),
-                response_mime_type="application/json",
-                response_schema={
-                    "type": "OBJECT",
-                    "properties": {
-                        "analysis_log": {"type": "STRING", "description": "Confirm you deleted all metaphors."},
-                        "q1_answer": {"type": "STRING", "description": "Hook (Concrete)"},
-                        "q2_answer": {"type": "STRING", "description": "Academics (Argumentative)"},
-                        "q3_answer": {"type": "STRING", "description": "Activities (Direct)"}
-                    },
-                    "required": ["analysis_log", "q1_answer", "q2_answer", "q3_answer"]
-                },
-                temperature=1.0 # Controlled creativity - stay close to exemplar style
-            )
+    return system_instruction, master_banned
+
+_generation_prompts = prompt_compiler.PromptCompiler(_generation_prompt_template)
+
+def build_generation_prompt(user_profile: str, retrieved_exemplars: str, brain_config: dict) -> str:
+    """Builds the Phoenix system instruction (the style-clone prompt)."""
+    # DEFENSIVE: Ensure brain_config is a dict
+    if not isinstance(brain_config, dict):
+        brain_config = {}
+    return _generation_prompts.render(
+        brain_config, brain_config_version(brain_config),
+        exemplars=retrieved_exemplars, profile=user_profile
+    )
+
+def get_prompt_stats():
+    """Generation prompt size metrics (characters and estimated tokens)."""
+    return _generation_prompts.get_stats()
+
+def generation_config(system_instruction, model=DEFAULT_MODEL, temperature=GENERATION_TEMPERATURE, seed=None):
+    """GenerateContentConfig for the main Phoenix drafting call."""
+    # Blueprint 7.0: SCORCHED EARTH - High Temp for Chaos
+    # Only the primary tier gets a thinking budget; the fallback tier may not support it
+    thinking_config = None
+    if model == DEFAULT_MODEL:
+        thinking_config = types.ThinkingConfig(
+            include_thoughts=False,
+            thinking_budget=GENERATION_THINKING_BUDGET
         )
-        
-        result = json.loads(response.text)
-        if isinstance(result, list):
-            result = result[0] if len(result) > 0 else {}
-        
-        # HARD LIMIT ENFORCEMENT (4200 chars max - allows proper endings)
-        q1 = result.get("q1_answer", "")
-        q2 = result.get("q2_answer", "")
-        q3 = result.get("q3_answer", "")
-        total = len(q1) + len(q2) + len(q3)
-        
-        if total > 4200:
-            # Helper function to truncate at last complete sentence
-            def truncate_at_sentence(text, max_chars):
-                if len(text) <= max_chars:
-                    return text
-                truncated = text[:max_chars]
-                # Find last sentence-ending punctuation
-                last_period = truncated.rfind('.')
-                last_exclaim = truncated.rfind('!')
-                last_question = truncated.rfind('?')
-                last_end = max(last_period, last_exclaim, last_question)
-                if last_end > max_chars * 0.5:  # Only if we keep at least half
-                    return truncated[:last_end + 1]
-                return truncated  # Fallback if no good sentence end found
-            
-            # Proportionally truncate each section at sentence boundaries
-            ratio = 3950 / total  # Target 3950 to leave buffer
-            result["q1_answer"] = truncate_at_sentence(q1, int(len(q1) * ratio))
-            result["q2_answer"] = truncate_at_sentence(q2, int(len(q2) * ratio))
-            result["q3_answer"] = truncate_at_sentence(q3, int(len(q3) * ratio))
-            print(f"TRUNCATED: {total} -> {len(result['q1_answer']) + len(result['q2_answer']) + len(result['q3_answer'])}")
-        
-        # GRAMMAR CHECK - Fix any grammar issues before output
-        def grammar_check(text, client):
-            if not text or len(text) < 50:
+    return gemini_client.build_config(
+        model,
+        system_instruction=system_instruction,
+        thinking_config=thinking_config,
+        response_mime_type="application/json",
+        response_schema=GENERATION_SCHEMA,
+        temperature=temperature,
+        seed=seed
+    )
+
+def postprocess_fingerprint(section_repair=True):
+    """Settings of the steps run on a draft after generation; part of the cache key."""
+    return {
+        "grammar_engine": GRAMMAR_ENGINE,
+        "grammar_escalate": [grammar_local.ESCALATE_EDIT_RATIO, grammar_local.ESCALATE_UNKNOWN_WORDS],
+        "local_repair": LOCAL_REPAIR,
+        "section_repair": SECTION_REPAIR if section_repair else "off",
+        "length_fit_budget": LENGTH_FIT_BUDGET,
+    }
+
+def generation_cache_key(system_instruction, brain_config, best_of=1, section_repair=True):
+    """
+    Identical prompt + model settings + brain version + post-processing settings
+    => identical draft. The streaming path never runs section repair, so it
+    passes section_repair=False. Only drafts written by DEFAULT_MODEL are
+    stored under it.
+    """
+    fields = {}
+    if best_of > 1:
+        fields = {"best_of": best_of, "temperature_spread": BEST_OF_TEMPERATURE_SPREAD}
+    return generation_cache.make_key(
+        "generate_separated_essay", system_instruction, model=DEFAULT_MODEL,
+        temperature=GENERATION_TEMPERATURE, thinking_budget=GENERATION_THINKING_BUDGET,
+        brain_config_version=brain_config_version(brain_config),
+        postprocess=postprocess_fingerprint(section_repair), **fields
+    )
+
+def parse_generation_result(response_text):
+    """Parses the model's JSON answer into the q1/q2/q3 result dict."""
+    result = json.loads(response_text)
+    if isinstance(result, list):
+        result = result[0] if len(result) > 0 else {}
+    return result
+
+LENGTH_FIT_BUDGET = 3950  # leave a buffer under the UCAS limit
+
+def enforce_length_limit(result, brain_config=None):
+    """
+    Brings an over-limit draft under UCAS_LIMIT_CHARS in place by dropping whole
+    sentences (never a section's closing sentence, so Q3 keeps its Forward
+    Projection) to land near the blueprint's q1/q2/q3 split.
+    """
+    texts = {key: result.get(key, "") for key in SECTION_KEYS}
+    total = len("\n".join(texts.values()))
+    if total <= UCAS_LIMIT_CHARS:
+        return result
+    
+    fitted = length_fitter.fit_sections(
+        texts, section_targets(brain_config or {}), LENGTH_FIT_BUDGET, separator_chars=len(SECTION_KEYS) - 1,
+        min_total=UCAS_MIN_CHARS
+    )
+    if fitted is None:
+        # Even the protected sentences don't fit: proportional cut as a last resort
+        def truncate_at_sentence(text, max_chars):
+            if len(text) <= max_chars:
                 return text
+            truncated = text[:max_chars]
+            # Find last sentence-ending punctuation
+            last_period = truncated.rfind('.')
+            last_exclaim = truncated.rfind('!')
+            last_question = truncated.rfind('?')
+            last_end = max(last_period, last_exclaim, last_question)
+            if last_end > max_chars * 0.5:  # Only if we keep at least half
+                return truncated[:last_end + 1]
+            return truncated  # Fallback if no good sentence end found
+        
+        ratio = LENGTH_FIT_BUDGET / total
+        fitted = {key: truncate_at_sentence(text, int(len(text) * ratio)) for key, text in texts.items()}
+    result.update(fitted)
+    print(f"TRUNCATED: {total} -> {len(_join_sections(result))}")
+    return result
+
+# ============================================================================
+# HEDGED DRAFTING - Backup request / fallback tier under a latency SLO
+# ============================================================================
+HEDGE_MODEL = os.environ.get("HEDGE_MODEL", GRAMMAR_MODEL)
+_generation_hedger = hedging.Hedger(primary=DEFAULT_MODEL, backup=HEDGE_MODEL)
+
+def _is_valid_generation(text):
+    try:
+        result = parse_generation_result(text)
+    except Exception:
+        return False
+    return isinstance(result, dict) and all(result.get(key) for key in SECTION_KEYS)
+
+def hedged_generate_content(client, system_instruction):
+    """
+    Runs the drafting call through the hedger: a backup request is issued if the
+    primary is slower than the hedge threshold, and the circuit breaker routes to
+    the fallback tier while the primary is failing. Attempts stream so a losing
+    attempt can stop reading and close its connection. Returns (text, info).
+    """
+    limiter = rate_limiter.get_limiter()
+
+    def attempt(model, cancel_event):
+        config = generation_config(system_instruction, model)
+        limiter.acquire(model, rate_limiter.estimate_tokens(GENERATION_CONTENTS, config))
+        stream = client.models.generate_content_stream(
+            model=model,
+            contents=GENERATION_CONTENTS,
+            config=config
+        )
+        parts = []
+        try:
+            for chunk in stream:
+                if cancel_event.is_set():
+                    raise hedging.Cancelled()
+                parts.append(chunk.text or "")
+        except Exception as e:
+            e_str = str(e).lower()
+            if "429" in e_str or "resource_exhausted" in e_str:
+                limiter.throttle(model, rate_limiter.backoff_delay(0, rate_limiter.retry_after_hint(e)))
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        return "".join(parts)
+
+    return _generation_hedger.call(attempt, validate=_is_valid_generation)
+
+def get_hedging_stats():
+    return _generation_hedger.get_stats()
+
+# ============================================================================
+# BEST-OF-N DRAFTING - Parallel drafts, scored and picked locally
+# ============================================================================
+BEST_OF_N = int(os.environ.get("BEST_OF_N", "1"))  # 1 = single draft
+BEST_OF_MAX = int(os.environ.get("BEST_OF_MAX", "4"))  # cap on drafts per request, whoever asks
+BEST_OF_CONCURRENCY = int(os.environ.get("BEST_OF_CONCURRENCY", "4"))
+BEST_OF_TEMPERATURE_SPREAD = float(os.environ.get("BEST_OF_TEMPERATURE_SPREAD", "0.3"))
+LENGTH_FIT_WEIGHT = 20  # gate points a perfect length fit is worth
+BEST_OF_STYLE_WEIGHT = float(os.environ.get("BEST_OF_STYLE_WEIGHT", "20"))  # points for a perfect style match
+
+_draft_pool = ThreadPoolExecutor(max_workers=max(1, BEST_OF_CONCURRENCY), thread_name_prefix="draft")
+
+def length_fit(result, brain_config):
+    """
+    0..1: how close the draft is to the target length and the blueprint's
+    q1/q2/q3 split. Anything over the UCAS limit scores 0.
+    """
+    lengths = {key: len(result.get(key, "")) for key in SECTION_KEYS}
+    total = sum(lengths.values())
+    if total == 0 or total > UCAS_LIMIT_CHARS:
+        return 0.0
+    targets = section_targets(brain_config)
+    target_total = sum(targets.values())
+    total_fit = max(0.0, 1 - abs(total - target_total) / target_total)
+    split_error = sum(abs(lengths[key] / total - targets[key] / target_total) for key in SECTION_KEYS)
+    return round(total_fit * (1 - split_error / 2), 3)
+
+def draft_settings(n):
+    """(temperature, seed) for each of n drafts, spread around GENERATION_TEMPERATURE."""
+    if n == 1:
+        return [(GENERATION_TEMPERATURE, None)]
+    low = GENERATION_TEMPERATURE - BEST_OF_TEMPERATURE_SPREAD / 2
+    step = BEST_OF_TEMPERATURE_SPREAD / (n - 1)
+    return [(round(min(2.0, max(0.0, low + i * step)), 3), random.randint(0, 2**31 - 1)) for i in range(n)]
+
+def score_draft(result, brain_config):
+    """Local score for a draft: quality_gate plus a length-fit bonus. Returns a score-table row."""
+    essay = "\n".join(result.get(key, "") for key in SECTION_KEYS)
+    passed, issues, gate_score = quality_gate(essay, brain_config)
+    fit = length_fit(result, brain_config)
+    return {
+        "passed": passed,
+        "gate_score": gate_score,
+        "length_fit": fit,
+        "score": round(gate_score + LENGTH_FIT_WEIGHT * fit, 2),
+        "chars": len(essay),
+        "issues": issues,
+    }
+
+def style_scores(drafts, retrieved_exemplars):
+    """
+    Local style similarity (0..1) of each draft to the retrieved exemplars:
+    MiniLM semantics plus sentence-length, punctuation and function-word
+    profiles. Returns the stylometry component dict of NumPy arrays.
+    """
+    exemplars = retrieved_exemplars.split(retrieval.EXEMPLAR_SEPARATOR) if retrieved_exemplars else []
+    try:
+        embeddings = get_embedding_function()
+    except Exception as e:
+        print(f"WARNING: Embedding model unavailable for style scoring ({e}); using stylometric features only")
+        embeddings = None
+    return stylometry.style_similarity(drafts, exemplars, embeddings)
+
+def best_of_drafts(client, system_instruction, brain_config, n, retrieved_exemplars=None):
+    """
+    Launches n drafts concurrently (at most BEST_OF_CONCURRENCY at once) with
+    varied temperatures and seeds, scores each locally and returns
+    (best_result, score_table, info). Passing drafts always beat failing ones.
+    With exemplars, style similarity to them adds up to BEST_OF_STYLE_WEIGHT points.
+    n is clamped to 1..BEST_OF_MAX.
+    """
+    n = max(1, min(int(n), BEST_OF_MAX))
+    # Follow the hedger's breaker: while the primary tier is failing, draft on the fallback
+    model = DEFAULT_MODEL if _generation_hedger.breaker.state == "closed" else HEDGE_MODEL
+
+    def draft(index, temperature, seed):
+        start = time.perf_counter()
+        response = safe_generate_content(
+            client,
+            model=model,
+            contents=GENERATION_CONTENTS,
+            config=generation_config(system_instruction, model, temperature=temperature, seed=seed)
+        )
+        result = parse_generation_result(response.text)
+        enforce_length_limit(result, brain_config)
+        row = {"draft": index, "temperature": temperature, "seed": seed,
+               "seconds": round(time.perf_counter() - start, 3)}
+        row.update(score_draft(result, brain_config))
+        return result, row
+
+    futures = [_draft_pool.submit(draft, i, temperature, seed)
+               for i, (temperature, seed) in enumerate(draft_settings(n))]
+    drafts = []
+    table = []
+    for i, future in enumerate(futures):
+        try:
+            drafts.append(future.result())
+        except Exception as e:
+            print(f"WARNING: Draft {i} failed: {e}")
+            table.append({"draft": i, "error": str(e)})
+    if not drafts:
+        raise RuntimeError(table[0]["error"] if table else "No drafts produced")
+    if retrieved_exemplars and BEST_OF_STYLE_WEIGHT > 0:
+        # One batched pass over every draft
+        styles = style_scores([_join_sections(result) for result, _ in drafts], retrieved_exemplars)["score"]
+        for (_, row), style in zip(drafts, styles):
+            row["style"] = float(style)
+            row["score"] = round(row["score"] + BEST_OF_STYLE_WEIGHT * float(style), 2)
+
+    best, best_row = max(drafts, key=lambda d: (d[1]["passed"], d[1]["score"]))
+    table.extend(row for _, row in drafts)
+    table.sort(key=lambda row: row["draft"])
+    for row in table:
+        row["selected"] = row is best_row
+    info = {"model": model, "drafts": n, "drafts_ok": len(drafts), "best_draft": best_row["draft"]}
+    return best, table, info
+
+# ============================================================================
+# LOCAL PHRASE REPAIR - Deterministic fixes before any LLM rewrite
+# ============================================================================
+LOCAL_REPAIR = os.environ.get("LOCAL_REPAIR", "on").lower()
+MAX_LIST_TRANSITIONS = 2  # quality_gate flags more than this
+
+_phrase_repairers = OrderedDict()  # brain_config version -> PhraseRepairer
+_phrase_repairers_lock = threading.Lock()
+
+def _join_sections(result):
+    return "\n".join(result.get(key, "") for key in SECTION_KEYS)
+
+def section_spans(result, brain_config=None):
+    """
+    Gate matches per section, from one scan of the joined essay:
+    {section_key: {category: [(start, end, term), ...]}} with section-local offsets.
+    """
+    spans = scan_essay(_join_sections(result), brain_config)
+    per_section = {}
+    offset = 0
+    for key in SECTION_KEYS:
+        end = offset + len(result.get(key, ""))
+        per_section[key] = {
+            category: [(s - offset, e - offset, term) for s, e, term in hits if offset <= s < end]
+            for category, hits in spans.items()
+        }
+        offset = end + 1
+    return per_section
+
+def get_phrase_repairer(brain_config=None):
+    """Repairer for the curated table plus the brain config's "term -> replacement" Anti_Patterns."""
+    version = brain_config_version(brain_config)
+    with _phrase_repairers_lock:
+        repairer = _phrase_repairers.get(version)
+        if repairer is not None:
+            _phrase_repairers.move_to_end(version)
+            return repairer
+    table = dict(phrase_repair.REPLACEMENTS)
+    if brain_config:
+        table.update(phrase_repair.replacements_from_anti_patterns(brain_config.get("Anti_Patterns", [])))
+    repairer = phrase_repair.PhraseRepairer(table)
+    with _phrase_repairers_lock:
+        _phrase_repairers[version] = repairer
+        while len(_phrase_repairers) > 8:
+            _phrase_repairers.popitem(last=False)
+    return repairer
+
+def local_repair(result, brain_config=None):
+    """
+    Rewrites banned words/phrases and surplus list transitions from the
+    replacement table, in place, then re-runs quality_gate. Returns a report;
+    "unresolved" lists banned terms the table could not fix.
+    """
+    start = time.perf_counter()
+    passed, _, score = quality_gate(_join_sections(result), brain_config)
+    report = {"passed_before": passed, "score_before": score, "edits": [], "unresolved": []}
+    if not passed:
+        repairer = get_phrase_repairer(brain_config)
+        spans = section_spans(result, brain_config)
+        transitions_kept = 0
+        for key in SECTION_KEYS:
+            targets = spans[key]["banned_word"] + spans[key]["banned_phrase"] + spans[key]["banned_term"]
+            for span in spans[key]["list_transition"]:
+                transitions_kept += 1
+                if transitions_kept > MAX_LIST_TRANSITIONS:
+                    targets.append(span)
+            if not targets:
+                continue
+            result[key], edits, unresolved = repairer.repair(result.get(key, ""), targets)
+            report["edits"].extend(dict(edit, section=key) for edit in edits)
+            report["unresolved"].extend(unresolved)
+        passed, _, score = quality_gate(_join_sections(result), brain_config)
+    report.update({"passed": passed, "score": score, "seconds": round(time.perf_counter() - start, 4)})
+    if report["edits"]:
+        print(f"DEBUG: Local repair made {len(report['edits'])} edits (score {report['score_before']} -> {score})")
+    return report
+
+# ============================================================================
+# SECTION REPAIR - Regenerate only the q1/q2/q3 answer the gate flagged
+# ============================================================================
+SECTION_REPAIR = os.environ.get("SECTION_REPAIR", "off").lower()  # "on" = repair inside the pipeline
+SECTION_REPAIR_ROUNDS = int(os.environ.get("SECTION_REPAIR_ROUNDS", "3"))
+SECTION_REPAIR_TOKEN_BUDGET = int(os.environ.get("SECTION_REPAIR_TOKEN_BUDGET", "20000"))
+REPAIR_MODEL = os.environ.get("REPAIR_MODEL", DEFAULT_MODEL)
+REPAIR_THINKING_BUDGET = 1024
+
+SECTION_LABELS = {"q1_answer": "Q1 (Hook)", "q2_answer": "Q2 (Academics)", "q3_answer": "Q3 (Activities)"}
+
+REPAIR_PROMPT = """You are revising ONE section of a UCAS personal statement. The other sections are final and are shown only for context: do not rewrite or repeat them.
+
+=== FINAL SECTIONS (CONTEXT ONLY) ===
+{context}
+
+=== SECTION TO REWRITE: {label} ===
+{text}
+
+=== PROBLEMS TO FIX ===
+{problems}
+
+RULES:
+- Keep the same facts, voice and first-person style. Change only what the problems require.
+- Length: about {target} characters, never more than {max_chars}.
+- Never use any of these words or phrases: {banned}
+- Do not open sentences with Additionally, Furthermore, Moreover, In addition or Also.
+- Return ONLY the rewritten section text."""
+
+def section_issues(result, brain_config=None):
+    """
+    Gate problems that can be pinned to a single section: banned words/phrases,
+    list transitions (when over the gate's limit) and the UCAS length limit.
+    Returns {section_key: [problem, ...]} for the sections that need work.
+    """
+    spans = section_spans(result, brain_config)
+    transitions = sum(len(spans[key]["list_transition"]) for key in SECTION_KEYS)
+    problems = {key: [] for key in SECTION_KEYS}
+    for key in SECTION_KEYS:
+        for category in ("banned_word", "banned_phrase", "banned_term"):
+            for _, _, term in spans[key].get(category, ()):
+                problems[key].append(f"Remove the banned {category.split('_')[1]} '{term}'")
+        if transitions > MAX_LIST_TRANSITIONS:
+            for _, _, term in spans[key]["list_transition"]:
+                problems[key].append(f"Drop the list transition '{term}'")
+    if len(_join_sections(result)) > UCAS_LIMIT_CHARS:
+        for key, target in section_targets(brain_config or {}).items():
+            if len(result.get(key, "")) > target:
+                problems[key].append(f"Too long: cut to about {target} characters")
+    return {key: sorted(set(p)) for key, p in problems.items() if p}
+
+def _section_max_chars(result, key, brain_config):
+    """Longest a repaired section may be without pushing the essay over the limit."""
+    room = UCAS_LIMIT_CHARS - sum(len(result.get(o, "")) for o in SECTION_KEYS if o != key) - len(SECTION_KEYS)
+    return max(200, min(room, int(section_targets(brain_config)[key] * 1.15)))
+
+def _usage_tokens(response, fallback):
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None) if usage is not None else None
+    return total or fallback
+
+def repair_section(client, result, key, problems, brain_config):
+    """Regenerates one section with the others frozen. Returns (new_text, tokens_used)."""
+    others = [other for other in SECTION_KEYS if other != key]
+    context = "\n\n".join(f"{SECTION_LABELS[o]}:\n{result.get(o, '')}" for o in others)
+    target = section_targets(brain_config)[key]
+    max_chars = _section_max_chars(result, key, brain_config)
+    banned = _generation_prompts.get(brain_config, brain_config_version(brain_config)).banned_terms
+    prompt = REPAIR_PROMPT.format(
+        context=context, label=SECTION_LABELS[key], text=result.get(key, ""),
+        problems="\n".join(f"- {p}" for p in problems), target=target, max_chars=max_chars,
+        banned=", ".join(banned)
+    )
+    thinking_config = None
+    if REPAIR_MODEL == DEFAULT_MODEL:
+        thinking_config = types.ThinkingConfig(include_thoughts=False, thinking_budget=REPAIR_THINKING_BUDGET)
+    config = gemini_client.build_config(REPAIR_MODEL, thinking_config=thinking_config,
+                                        temperature=GENERATION_TEMPERATURE)
+    response = safe_generate_content(client, model=REPAIR_MODEL, contents=prompt, config=config)
+    text = (response.text or "").strip()
+    estimate = rate_limiter.estimate_tokens(prompt) + REPAIR_THINKING_BUDGET + len(text) // rate_limiter.CHARS_PER_TOKEN
+    return text, _usage_tokens(response, estimate)
+
+def repair_sections(result, brain_config, client=None, system_instruction=None, full_seconds=None,
+                    max_rounds=None, token_budget=None):
+    """
+    Repair loop: regenerate only the flagged sections (in parallel, others frozen)
+    until quality_gate passes or the round/token budget runs out. Edits `result`
+    in place and returns a report comparing the cost with full regenerations.
+    """
+    client = client or gemini_client.get_client()
+    brain_config = brain_config if isinstance(brain_config, dict) else {}
+    max_rounds = SECTION_REPAIR_ROUNDS if max_rounds is None else max_rounds
+    token_budget = SECTION_REPAIR_TOKEN_BUDGET if token_budget is None else token_budget
+    start = time.perf_counter()
+
+    # Cost of the alternative: one full Phoenix draft per round
+    if system_instruction:
+        prompt_tokens = rate_limiter.estimate_tokens(GENERATION_CONTENTS, generation_config(system_instruction))
+    else:
+        prompt_tokens = _generation_prompts.get_stats()["tokens_est_avg"] or 3000
+    full_tokens = prompt_tokens + GENERATION_THINKING_BUDGET + UCAS_LIMIT_CHARS // rate_limiter.CHARS_PER_TOKEN
+    if full_seconds is None:
+        full_seconds = _generation_hedger.latency.percentile(50) or hedging.HEDGE_DEFAULT_SECONDS
+
+    passed, _, score = quality_gate(_join_sections(result), brain_config)
+    report = {"passed_before": passed, "score_before": score, "rounds": 0, "sections": [], "tokens_used": 0}
+    while not passed and report["rounds"] < max_rounds and report["tokens_used"] < token_budget:
+        problems = section_issues(result, brain_config)
+        if not problems:
+            break  # only whole-essay issues left (struggle markers, density); a section rewrite won't fix them
+        futures = {key: _draft_pool.submit(repair_section, client, result, key, issues, brain_config)
+                   for key, issues in problems.items()}
+        previous = dict(result)
+        for key, future in futures.items():
             try:
-                grammar_response = client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=f"""Fix ONLY grammar and spelling errors in this text. 
-Do NOT change the meaning, style, or add any new content.
-Return ONLY the corrected text, nothing else.
+                text, tokens = future.result()
+            except Exception as e:
+                print(f"WARNING: Repair of {key} failed: {e}")
+                continue
+            report["tokens_used"] += tokens
+            if text and len(text) <= _section_max_chars(previous, key, brain_config):
+                result[key] = text
+        report["rounds"] += 1
+        report["sections"].append(sorted(problems))
+        new_passed, _, new_score = quality_gate(_join_sections(result), brain_config)
+        if not new_passed and new_score < score:
+            result.update(previous)  # the rewrite made things worse; keep the earlier text
+            continue
+        passed, score = new_passed, new_score
 
-Text: {text}""",
-                    config=types.GenerateContentConfig(temperature=0.1)
-                )
-                return grammar_response.text.strip()
-            except:
-                return text  # Return original if grammar check fails
+    seconds = time.perf_counter() - start
+    rounds = report["rounds"]
+    report.update({
+        "passed": passed,
+        "score": score,
+        "seconds": round(seconds, 3),
+        "tokens_full_regen": full_tokens * rounds,
+        "tokens_saved": full_tokens * rounds - report["tokens_used"],
+        "seconds_full_regen": round(full_seconds * rounds, 3),
+        "seconds_saved": round(full_seconds * rounds - seconds, 3),
+    })
+    print(f"DEBUG: Section repair: {report}")
+    return report
+
+def generate_separated_essay(user_profile: str, retrieved_exemplars: str, brain_config: dict,
+                             best_of: int = None) -> dict:
+    """ 
+    Phoenix 5.0: THE HUMANIZER PROTOCOL.
+    best_of > 1 drafts that many essays in parallel and keeps the best one
+    (score table in result["_best_of"]); defaults to BEST_OF_N, capped at BEST_OF_MAX.
+    Concurrent identical requests share a single pipeline run.
+    """
+    if not isinstance(brain_config, dict):
+        brain_config = {}
+    best_of = max(1, min(int(best_of or BEST_OF_N), BEST_OF_MAX))
+    flight_key = single_flight.request_key(
+        "generate_separated_essay", user_profile, retrieved_exemplars, brain_config_version(brain_config), best_of
+    )
+    return single_flight.get_single_flight().do(
+        flight_key, _generate_separated_essay, user_profile, retrieved_exemplars, brain_config, best_of
+    )
+
+def _generate_separated_essay(user_profile: str, retrieved_exemplars: str, brain_config: dict,
+                              best_of: int = 1) -> dict:
+    client = gemini_client.get_client()
+    timings = {}
+    
+    # DEFENSIVE: Ensure brain_config is a dict
+    if not isinstance(brain_config, dict):
+        brain_config = {}
+    
+    system_instruction = build_generation_prompt(user_profile, retrieved_exemplars, brain_config)
+
+    # CACHE: serve identical requests from disk when GENERATION_CACHE is on
+    cache = generation_cache.get_cache()
+    cache_key = generation_cache_key(system_instruction, brain_config, best_of)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        cached["_timings"] = {"cache": "hit"}
+        return cached
+
+    try:
+        stage_start = time.perf_counter()
+        if best_of > 1:
+            result, score_table, best_info = best_of_drafts(
+                client, system_instruction, brain_config, best_of, retrieved_exemplars
+            )
+            result["_best_of"] = score_table
+            timings["generation_s"] = round(time.perf_counter() - stage_start, 3)
+            timings["generation_model"] = best_info["model"]
+            timings["drafts"] = best_info["drafts"]
+            timings["drafts_ok"] = best_info["drafts_ok"]
+        else:
+            response_text, hedge_info = hedged_generate_content(client, system_instruction)
+            
+            timings["generation_s"] = round(time.perf_counter() - stage_start, 3)
+            timings["generation_model"] = hedge_info["model"]
+            timings["hedged"] = hedge_info["hedged"]
+            
+            result = parse_generation_result(response_text)
+            
+            # HARD LIMIT ENFORCEMENT (whole sentences dropped to land under 4000 chars)
+            enforce_length_limit(result, brain_config)
         
-        result["q1_answer"] = grammar_check(result.get("q1_answer", ""), client)
-        result["q2_answer"] = grammar_check(result.get("q2_answer", ""), client)
-        result["q3_answer"] = grammar_check(result.get("q3_answer", ""), client)
+        # LOCAL REPAIR - table-driven fixes for banned terms; the LLM only sees what's left
+        if LOCAL_REPAIR == "on":
+            result["_local_repair"] = local_repair(result, brain_config)
+        
+        # SECTION REPAIR - fix only the flagged answers instead of a full redraft
+        if SECTION_REPAIR == "on":
+            result["_repair"] = repair_sections(
+                result, brain_config, client, system_instruction, full_seconds=timings["generation_s"]
+            )
+        
+        # GRAMMAR CHECK - Fix any grammar issues before output (q1/q2/q3 in parallel)
+        timings.update(grammar_check_sections(result, client))
+        # The key names the primary model; a fallback-tier draft must not be replayed as its answer
+        if timings["generation_model"] == DEFAULT_MODEL:
+            cache.put(cache_key, result)
+        result["_timings"] = timings
+        print(f"DEBUG: Stage timings: {timings}")
         
         return result
 
     except Exception as e:
         return {"error": str(e)}
 
+# ============================================================================
+# STREAMING GENERATION - Section text as Gemini writes it
+# ============================================================================
+class SectionStreamParser:
+    """
+    Incremental reader for the streamed JSON answer. Feed it raw text chunks;
+    it returns (key, decoded_text) deltas for string values as they arrive.
+    """
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.state = "seek_key"
+        self.key = ""
+        self.pending = ""  # unfinished escape sequence
+
+    def feed(self, chunk):
+        deltas = []
+        value = []
+        for ch in chunk:
+            if self.state == "seek_key":
+                if ch == '"':
+                    self.key = ""
+                    self.state = "in_key"
+            elif self.state == "in_key":
+                if ch == '"':
+                    self.state = "seek_value"
+                else:
+                    self.key += ch
+            elif self.state == "seek_value":
+                if ch == '"':
+                    self.state = "in_value"
+                elif ch not in ": \t\r\n":
+                    self.state = "seek_key"  # non-string value, skip it
+            elif self.state == "in_value":
+                if self.pending:
+                    self.pending += ch
+                    if self.pending.startswith("\\u"):
+                        if len(self.pending) == 6:
+                            value.append(chr(int(self.pending[2:], 16)))
+                            self.pending = ""
+                    else:
+                        value.append(self._ESCAPES.get(ch, ch))
+                        self.pending = ""
+                elif ch == "\\":
+                    self.pending = ch
+                elif ch == '"':
+                    if value:
+                        deltas.append((self.key, "".join(value)))
+                        value = []
+                    self.state = "seek_key"
+                else:
+                    value.append(ch)
+        if value:
+            deltas.append((self.key, "".join(value)))
+        return deltas
+
+def generate_separated_essay_stream(user_profile: str, retrieved_exemplars: str, brain_config: dict):
+    """
+    Streaming variant of generate_separated_essay. Yields event dicts:
+      {"event": "drafting", "attempt": 0}
+      {"event": "section_delta", "section": "q1_answer", "text": "..."}
+      {"event": "gate_abort", "reason": "...", "attempt": 0, "counts": {...}}
+          (streaming gate hard failure: discard the sections so far; a new
+           "drafting" event follows)
+      {"event": "grammar_pass"}
+      {"event": "quality_gate", "passed": bool, "issues": [...], "score": int}
+      {"event": "result", "result": {...}}   or   {"event": "error", "detail": "..."}
+    The final result matches what generate_separated_essay returns. Like
+    /generate, it drafts on the fallback tier while the breaker is open.
+    """
+    client = gemini_client.get_client()
+    timings = {}
+    
+    if not isinstance(brain_config, dict):
+        brain_config = {}
+    
+    system_instruction = build_generation_prompt(user_profile, retrieved_exemplars, brain_config)
+    cache = generation_cache.get_cache()
+    cache_key = generation_cache_key(system_instruction, brain_config, section_repair=False)
+
+    def finish(result):
+        essay = "\n".join(result.get(key, "") for key in SECTION_KEYS)
+        passed, issues, score = quality_gate(essay, brain_config)
+        yield {"event": "quality_gate", "passed": passed, "issues": issues, "score": score}
+        yield {"event": "result", "result": result}
+    
+    cached = cache.get(cache_key)
+    if cached is not None:
+        cached["_timings"] = {"cache": "hit"}
+        for key in SECTION_KEYS:
+            yield {"event": "section_delta", "section": key, "text": cached.get(key, "")}
+        yield from finish(cached)
+        return
+    
+    try:
+        stage_start = time.perf_counter()
+        breaker = _generation_hedger.breaker
+        
+        # Re-issue the draft as soon as the streaming gate sees a hard failure;
+        # the last attempt always runs to completion
+        for attempt in range(STREAM_GATE_RETRIES + 1):
+            yield {"event": "drafting", "attempt": attempt}
+            # Same breaker as /generate: while the primary is failing, stream from the fallback tier
+            model = DEFAULT_MODEL if breaker.allow() else HEDGE_MODEL
+            timings["generation_model"] = model
+            parser = SectionStreamParser()
+            gate = StreamingGate(brain_config)
+            enforce_gate = attempt < STREAM_GATE_RETRIES
+            raw_parts = []
+            aborted = None
+            stream = safe_generate_content_stream(
+                client,
+                contents=GENERATION_CONTENTS,
+                model=model,
+                config=generation_config(system_instruction, model)
+            )
+            try:
+                for chunk in stream:
+                    text = chunk.text or ""
+                    if not text:
+                        continue
+                    if "first_token_s" not in timings:
+                        timings["first_token_s"] = round(time.perf_counter() - stage_start, 3)
+                    raw_parts.append(text)
+                    for key, delta in parser.feed(text):
+                        if key in SECTION_KEYS:
+                            yield {"event": "section_delta", "section": key, "text": delta}
+                            if gate.feed(key, delta) and enforce_gate:
+                                aborted = gate.abort_reason
+                    if aborted:
+                        break
+            except Exception:
+                if model == DEFAULT_MODEL:
+                    breaker.record_failure()
+                raise
+            finally:
+                stream.close()
+            if model == DEFAULT_MODEL:
+                breaker.record_success()
+            if not aborted:
+                break
+            timings.setdefault("gate_aborts", []).append(aborted)
+            print(f"DEBUG: Streaming gate abort ({aborted}); re-issuing draft")
+            yield {"event": "gate_abort", "reason": aborted, "attempt": attempt, "counts": gate.counts()}
+        timings["generation_s"] = round(time.perf_counter() - stage_start, 3)
+        
+        result = parse_generation_result("".join(raw_parts))
+        enforce_length_limit(result, brain_config)
+        if LOCAL_REPAIR == "on":
+            result["_local_repair"] = local_repair(result, brain_config)
+        
+        yield {"event": "grammar_pass"}
+        timings.update(grammar_check_sections(result, client))
+        if timings["generation_model"] == DEFAULT_MODEL:
+            cache.put(cache_key, result)
+        result["_timings"] = timings
+        print(f"DEBUG: Stage timings: {timings}")
+    except Exception as e:
+        yield {"event": "error", "detail": str(e)}
+        return
+    
+    yield from finish(result)
+
 # BANNED PHRASES - Generic clichés that must not appear
 BANNED_PHRASES = [
     "ever since I was young",
@@ -349,37 +1209,89 @@ DEFAULT_STYLE_GUIDE = {
 # ============================================================================
 # QUALITY GATE - The Final Quality Check (Auto-Regenerate if Fail)
 # ============================================================================
-def quality_gate(essay_text):
+# "List Logic" (The ChatGPT Test) - case-sensitive, counted per occurrence
+LIST_TRANSITIONS = ["Additionally", "Furthermore", "Moreover", "In addition", "Also,"]
+
+# "Struggle Markers" (The Grok Test) - stems, so "debug" also matches "debugging"
+STRUGGLE_MARKERS = ['failed', 'mistake', 'error', 'debug', 'struggle', 'revised', 
+                    'challenged', 'difficulty', 'problem', 'overcame', 'initially']
+
+def _build_gate_matcher(banned_terms=()):
+    """One compiled matcher for every word list the gate checks."""
+    matcher = phrase_matcher.PhraseMatcher()
+    matcher.add("banned_word", BANNED_WORDS)
+    matcher.add("banned_phrase", BANNED_PHRASES)
+    known = {t.lower() for t in BANNED_WORDS + BANNED_PHRASES}
+    matcher.add("banned_term", [t for t in banned_terms if t.lower() not in known])
+    matcher.add("list_transition", LIST_TRANSITIONS, case_sensitive=True)
+    matcher.add("struggle", STRUGGLE_MARKERS, prefix=True)
+    return matcher.compile()
+
+_gate_matcher = _build_gate_matcher()
+_gate_matchers = OrderedDict()  # brain_config version -> matcher with its banned terms
+_gate_matchers_lock = threading.Lock()
+
+def get_gate_matcher(brain_config=None):
+    """
+    The default matcher, or one that also bans the brain config's master list
+    (the same terms the generation prompt bans), rebuilt when the config changes.
+    """
+    if not brain_config:
+        return _gate_matcher
+    version = brain_config_version(brain_config)
+    with _gate_matchers_lock:
+        matcher = _gate_matchers.get(version)
+        if matcher is not None:
+            _gate_matchers.move_to_end(version)
+            return matcher
+    banned_terms = _generation_prompts.get(brain_config, version).banned_terms
+    matcher = _build_gate_matcher(banned_terms)
+    with _gate_matchers_lock:
+        _gate_matchers[version] = matcher
+        while len(_gate_matchers) > 8:
+            _gate_matchers.popitem(last=False)
+    return matcher
+
+def scan_essay(essay_text, brain_config=None):
+    """Match spans per category: {"banned_word": [(start, end, term), ...], ...}."""
+    return get_gate_matcher(brain_config).scan(essay_text)
+
+def quality_gate(essay_text, brain_config=None, spans=None):
     """
     Grades the essay before showing to user.
     Returns (passed: bool, reason: str, score: int)
+    Pass brain_config to also ban its Anti_Patterns and the user complaint list;
+    pass precomputed spans (from scan_essay) to skip the scan.
     """
     issues = []
     score = 100
+    if spans is None:
+        spans = scan_essay(essay_text, brain_config)
+    found = {category: {term for _, _, term in hits} for category, hits in spans.items()}
     
     # 1. Check for Banned Words
     for word in BANNED_WORDS:
-        if word.lower() in essay_text.lower():
+        if word in found["banned_word"]:
             issues.append(f"Contains banned word: '{word}'")
             score -= 5
+    for term in sorted(found.get("banned_term", ())):
+        issues.append(f"Contains banned term: '{term}'")
+        score -= 5
     
     # 2. Check for Banned Phrases
     for phrase in BANNED_PHRASES:
-        if phrase.lower() in essay_text.lower():
+        if phrase in found["banned_phrase"]:
             issues.append(f"Contains banned phrase: '{phrase}'")
             score -= 10
     
     # 3. Check for "List Logic" (The ChatGPT Test)
-    list_words = ["Additionally", "Furthermore", "Moreover", "In addition", "Also,"]
-    list_count = sum(essay_text.count(w) for w in list_words)
-    if list_count > 2:
+    list_count = len(spans["list_transition"])
+    if list_count > MAX_LIST_TRANSITIONS:
         issues.append(f"Too list-like ({list_count} list transitions)")
         score -= 15
     
     # 4. Check for "Struggle Markers" (The Grok Test)
-    struggle_words = ['failed', 'mistake', 'error', 'debug', 'struggle', 'revised', 
-                      'challenged', 'difficulty', 'problem', 'overcame', 'initially']
-    struggle_count = sum(1 for w in struggle_words if w.lower() in essay_text.lower())
+    struggle_count = len(found["struggle"])
     if struggle_count < 3:
         issues.append(f"Lacks narrative struggle (only {struggle_count} markers)")
         score -= 20
@@ -397,7 +1309,7 @@ def quality_gate(essay_text):
     if char_count > 4000:
         issues.append(f"OVER UCAS LIMIT ({char_count}/4000 chars)")
         score -= 100 # Instant Fail
-    elif char_count < 3000:
+    elif char_count < UCAS_MIN_CHARS:
         issues.append(f"Too short ({char_count} chars)")
         score -= 20
     
@@ -405,6 +1317,112 @@ def quality_gate(essay_text):
     
     return passed, issues, score
 
+# ============================================================================
+# STREAMING QUALITY GATE - Running counts while the draft is written
+# ============================================================================
+# Sentence-dropping (enforce_length_limit) fixes modest overruns locally, so
+# only abort a stream once the projected essay is far past the UCAS limit.
+STREAM_ABORT_OVER_CHARS = int(os.environ.get("STREAM_ABORT_OVER_CHARS", "4800"))
+STREAM_GATE_RETRIES = int(os.environ.get("STREAM_GATE_RETRIES", "1"))
+
+class StreamingGate:
+    """
+    Incremental quality_gate over streamed section deltas. Keeps running
+    counts (banned hits, list transitions, struggle markers, proper nouns,
+    characters) and sets abort_reason on a hard failure: a banned phrase the
+    local repair stage cannot fix, or a projected length over
+    STREAM_ABORT_OVER_CHARS.
+    """
+
+    def __init__(self, brain_config=None, abort_over_chars=None):
+        self.matcher = get_gate_matcher(brain_config)
+        self.repairer = get_phrase_repairer(brain_config) if LOCAL_REPAIR == "on" else None
+        self.targets = section_targets(brain_config or {})
+        self.abort_over_chars = STREAM_ABORT_OVER_CHARS if abort_over_chars is None else abort_over_chars
+        self.texts = {key: "" for key in SECTION_KEYS}
+        self._final_upto = {key: 0 for key in SECTION_KEYS}  # matches starting before this are settled
+        self._word_upto = {key: 0 for key in SECTION_KEYS}
+        self._hits = set()  # (section, start, category, term)
+        self._previous_word = None
+        self.proper_nouns = 0
+        self.abort_reason = None
+
+    def _scan(self, key, final):
+        text = self.texts[key]
+        # Only settle matches whose following character has arrived (word boundaries, stems)
+        settled = len(text) if final else max(0, len(text) - self.matcher.max_term_chars - 1)
+        window_start = max(0, self._final_upto[key] - self.matcher.max_term_chars)
+        while window_start > 0 and (text[window_start - 1].isalnum() or text[window_start - 1] == "_"):
+            window_start -= 1  # never start the window mid-word
+        for category, hits in self.matcher.scan(text[window_start:]).items():
+            for start, end, term in hits:
+                start += window_start
+                if final or (start < settled and end + window_start < len(text)):
+                    self._hits.add((key, start, category, term))
+        self._final_upto[key] = max(self._final_upto[key], settled)
+
+    def _count_words(self, key, final):
+        text = self.texts[key]
+        upto = len(text) if final else max(text.rfind(" "), text.rfind("\n")) + 1
+        for word in text[self._word_upto[key]:upto].split():
+            # Same heuristic as quality_gate: capitalised, not first, previous word not ending a sentence
+            if word[0].isupper() and self._previous_word is not None and self._previous_word[-1] != '.':
+                self.proper_nouns += 1
+            self._previous_word = word
+        self._word_upto[key] = max(self._word_upto[key], upto)
+
+    def projected_chars(self, key):
+        """Characters so far plus the blueprint target of the section being written and those not started."""
+        index = SECTION_KEYS.index(key)
+        done = sum(len(self.texts[k]) for k in SECTION_KEYS[:index])
+        current = max(len(self.texts[key]), self.targets[key])
+        later = sum(self.targets[k] for k in SECTION_KEYS[index + 1:])
+        return done + current + later + len(SECTION_KEYS) - 1
+
+    def feed(self, key, delta):
+        """Adds streamed text for a section. Returns the abort reason, or None to keep going."""
+        if key not in self.texts:
+            return None
+        # Sections arrive in order; the previous one is complete once the next starts
+        index = SECTION_KEYS.index(key)
+        if index and not self.texts[key]:
+            self._close(SECTION_KEYS[index - 1])
+        self.texts[key] += delta
+        self._scan(key, final=False)
+        self._count_words(key, final=False)
+        if self.abort_reason is None:
+            self.abort_reason = self._hard_failure(key)
+        return self.abort_reason
+
+    def _close(self, key):
+        self._scan(key, final=True)
+        self._count_words(key, final=True)
+
+    def close(self):
+        for key in SECTION_KEYS:
+            self._close(key)
+
+    def _hard_failure(self, key):
+        for _, _, category, term in sorted(self._hits):
+            if category in ("banned_phrase", "banned_term") and not (self.repairer and self.repairer.can_fix(term)):
+                return f"banned phrase '{term}'"
+        projected = self.projected_chars(key)
+        if projected > self.abort_over_chars:
+            return f"projected {projected} chars (limit {UCAS_LIMIT_CHARS})"
+        return None
+
+    def counts(self):
+        hits = {}
+        for _, _, category, term in self._hits:
+            hits.setdefault(category, []).append(term)
+        return {
+            "banned": sorted(set(hits.get("banned_word", []) + hits.get("banned_phrase", []) + hits.get("banned_term", []))),
+            "list_transitions": len(hits.get("list_transition", [])),
+            "struggle_markers": len(set(hits.get("struggle", []))),
+            "proper_nouns": self.proper_nouns,
+            "chars": len("\n".join(self.texts.values())),
+        }
+
 # 2. Force the database folder to be right here
 DB_PATH = os.path.join(BASE_DIR, 'chroma_db')
 
@@ -424,10 +1442,10 @@ def get_st_cache_resource():
 def get_embedding_function():
     """Returns a cached embedding function to avoid reloading the model."""
     print("DEBUG: Loading embedding model (first time only)...")
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2", # Explicit repo reduces lookup hangs
-        model_kwargs={'device': 'cpu'}
-    )
+    # torch (default) or onnx, per EMBEDDING_BACKEND
+    embeddings = embedding_models.load_embeddings()
+    # Repeated queries (the fixed Stage 1 query, re-run profiles) skip the forward pass
+    return embedding_cache.CachedEmbeddings(embeddings)
 
 @get_st_cache_resource()
 def get_vectorstore_client():
@@ -435,16 +1453,114 @@ def get_vectorstore_client():
     print(f"DEBUG: Connecting to Persistent Database at: {DB_PATH}")
     return chromadb.PersistentClient(path=DB_PATH)
 
+# chroma (default) or numpy: exact search over a memory-mapped export of the collection
+VECTOR_ENGINE = os.environ.get("VECTOR_ENGINE", "chroma").lower()
+
+def get_collection():
+    """The raw Chroma collection behind get_vectorstore()."""
+    return get_vectorstore_client().get_or_create_collection("college_essays")
+
 def get_vectorstore():
     """Returns the vectorstore object using the cached client and embeddings."""
     client = get_vectorstore_client()
     embedding_function = get_embedding_function()
     
-    return Chroma(
+    vectorstore = Chroma(
         client=client,
         collection_name="college_essays",
         embedding_function=embedding_function,
     )
+    if VECTOR_ENGINE == "numpy":
+        return numpy_index.NumpyVectorStore(vectorstore, embedding_function)
+    return vectorstore
+
+# dense (default): MiniLM similarity only; hybrid: BM25 + dense fused by reciprocal rank
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "dense").lower()
+
+def hybrid_search(query, k=20, filter=None):
+    """
+    BM25 over the inverted index and exact dense search over the NumPy index,
+    each taking its top k, fused with reciprocal-rank fusion. BM25 only walks
+    the postings of the query's terms and the dense side is one matrix-vector
+    product, so this skips the Chroma/HNSW round trip entirely.
+    """
+    # Chroma is only opened when one of the indexes has to be (re)built
+    index = numpy_index.ensure_index(get_collection)
+    lexical = lexical_index.get_index(get_collection).search(query, k=k, where=filter)
+    dense = index.search(get_embedding_function().embed_query(query), k=k, where=filter)
+    fused = retrieval.reciprocal_rank_fusion([
+        [index.ids[row] for row, _ in dense],
+        [chunk_id for chunk_id, _ in lexical],
+    ])
+    # Lexical hits missing from the vector index (export lagging an ingest) are skipped
+    return [index.document(index.rows[chunk_id]) for chunk_id in fused if chunk_id in index.rows][:k]
+
+def search_chunks(query, k=20, filter=None):
+    """
+    Top-k chunks for a query (dense or hybrid, per RETRIEVAL_MODE), served from
+    the retrieval cache until the collection version changes.
+    """
+    cache = retrieval_cache.get_cache()
+    key, version = cache.make_key(
+        query, k, filter, mode=RETRIEVAL_MODE, engine=VECTOR_ENGINE,
+        embeddings=f"{embedding_models.EMBEDDING_BACKEND}:{embedding_models.ONNX_INT8}",
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        return [Document(**doc) for doc in cached]
+    if RETRIEVAL_MODE == "hybrid":
+        docs = hybrid_search(query, k=k, filter=filter)
+    else:
+        docs = get_vectorstore().similarity_search(query, k=k, filter=filter)
+    cache.put(key, version, [{"page_content": d.page_content, "metadata": d.metadata, "id": d.id} for d in docs])
+    return docs
+
+# A partition (e.g. UCAS + law) is only searched on its own when it has this many chunks
+PARTITION_MIN_CHUNKS = int(os.environ.get("PARTITION_MIN_CHUNKS", "20"))
+_partition_sizes = {}
+
+def partition_size(where):
+    """Chunks matching a metadata filter, cached per collection version."""
+    key = (json.dumps(where, sort_keys=True), retrieval_cache.get_cache().version())
+    if key not in _partition_sizes:
+        if len(_partition_sizes) > 256:
+            _partition_sizes.clear()
+        _partition_sizes[key] = len(get_collection().get(where=where, include=[])["ids"])
+    return _partition_sizes[key]
+
+def partitioned_search(query, k, target_course, min_sources=1):
+    """
+    Searches the narrowest partition (subject family + UCAS, then UCAS only)
+    with at least PARTITION_MIN_CHUNKS chunks. Global results are appended
+    after the partition's when it returns fewer than k chunks or fewer than
+    `min_sources` source files (exemplar packing takes one chunk per source).
+    Untagged chunks (ingested before tagging, see retag_collection) only ever
+    come from the global search. Returns (docs, partition_filter or None).
+    """
+    for where in corpus_tags.partition_filters(target_course):
+        if partition_size(where) >= PARTITION_MIN_CHUNKS:
+            docs = search_chunks(query, k=k, filter=where)
+            if len(docs) < k or len({(d.metadata or {}).get("source") for d in docs}) < min_sources:
+                seen = {doc.id for doc in docs}
+                docs += [doc for doc in search_chunks(query, k=k) if doc.id not in seen]
+            return docs, where
+    return search_chunks(query, k=k), None
+
+def retrieve_exemplars(query, budget_tokens=None, max_chunks=None, candidate_k=None, target_course=None):
+    """
+    Stage 2 retrieval: the best-matched exemplar chunks for a student, packed
+    into the exemplar token budget. With a target_course the search is limited
+    to that subject's partition (see partitioned_search).
+    Returns (exemplar_text, pack_info).
+    """
+    candidate_k = candidate_k or max(20, (max_chunks or 5) * 4)
+    if target_course:
+        candidates, partition = partitioned_search(query, candidate_k, target_course, min_sources=max_chunks or 1)
+    else:
+        candidates, partition = search_chunks(query, k=candidate_k), None
+    exemplar_text, info = retrieval.pack_exemplars(candidates, budget_tokens=budget_tokens, max_chunks=max_chunks)
+    info["partition"] = partition
+    return exemplar_text, info
 
 def get_essay_count():
     try:
@@ -460,6 +1576,46 @@ def get_essay_count():
         print(f"Error counting essays: {e}")
         return 0
 
+# ============================================================================
+# WARM STARTUP - Load models and stores before the first request
+# ============================================================================
+WARMUP_QUERY = "personal statement motivation academic"  # same text app.py's Stage 1 embeds
+_warmup_state = {"ready": False, "components": {}, "errors": {}, "total_s": None}
+
+def warm_up():
+    """
+    Loads the embedding model, runs one embedding, opens the Chroma collection,
+    loads brain_config and builds the Gemini client, timing each step.
+    Returns the warm-up state (also available from get_warmup_state()).
+    """
+    steps = [
+        ("embedding_model", get_embedding_function),
+        ("dummy_embed", lambda: get_embedding_function().embed_query(WARMUP_QUERY)),
+        ("vector_collection", lambda: get_vectorstore()._collection.count()),
+        ("brain_config", load_brain_config),
+        ("gemini_client", gemini_client.get_client),
+    ]
+    total_start = time.perf_counter()
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            _warmup_state["errors"][name] = str(e)
+            print(f"WARNING: Warm-up step {name} failed: {e}")
+        _warmup_state["components"][name] = round(time.perf_counter() - start, 3)
+        print(f"DEBUG: Warm-up {name}: {_warmup_state['components'][name]}s")
+    _warmup_state["total_s"] = round(time.perf_counter() - total_start, 3)
+    _warmup_state["ready"] = not _warmup_state["errors"]
+    print(f"DEBUG: Warm-up finished in {_warmup_state['total_s']}s (ready={_warmup_state['ready']})")
+    return get_warmup_state()
+
+def get_warmup_state():
+    state = dict(_warmup_state)
+    state["components"] = dict(state["components"])
+    state["errors"] = dict(state["errors"])
+    return state
+
 # Path for the learned brain configuration
 BRAIN_CONFIG_PATH = os.path.join(BASE_DIR, 'brain_config.json')
 
@@ -468,7 +1624,11 @@ def analyze_all_essays():
     Global Learning: Analyzes ALL essays in the database to create a 
     unified Structure Blueprint and Style Bible.
     Saves to brain_config.json for use during generation.
+    A second click while an analysis is running waits for that run's result.
     """
+    return single_flight.get_single_flight().do("analyze_all_essays", _analyze_all_essays)
+
+def _analyze_all_essays():
     print("=== GLOBAL CORPUS ANALYSIS ===")
     
     # Check for essays
@@ -481,8 +1641,8 @@ def analyze_all_essays():
     if not api_key:
         return {"error": "GEMINI_API_KEY not set."}
     
-    client = genai.Client(api_key=api_key)
-    config = types.GenerateContentConfig(temperature=0.2)
+    client = gemini_client.get_client()
+    config = gemini_client.build_config(temperature=0.2)
     
     # Get ALL documents from the vectorstore (True "All", not just similarity)
     print(f"Retrieving all {essay_count} chunks...")
@@ -567,12 +1727,14 @@ def analyze_all_essays():
         brain_config["_metadata"] = {
             "analyzed_chunks": len(all_docs_text),
             "analysis_date": str(os.popen("date").read().strip()),
-            "model_used": "gemini-3-flash-preview"
+            "model_used": DEFAULT_MODEL
         }
         
-        # Save to file
-        with open(BRAIN_CONFIG_PATH, 'w') as f:
+        # Save to file (write-then-rename so readers never see a half-written config)
+        tmp_path = f"{BRAIN_CONFIG_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(brain_config, f, indent=2)
+        os.replace(tmp_path, BRAIN_CONFIG_PATH)
         
         print(f"Brain config saved to {BRAIN_CONFIG_PATH}")
         return brain_config
@@ -589,10 +1751,15 @@ def reset_brain():
     print("WARNING: Resetting Brain...")
     try:
         # 1. Reset Chroma (if possible easily) or just delete the folder
+        import shutil
         if os.path.exists(DB_PATH):
-            import shutil
             shutil.rmtree(DB_PATH)
             print(f"Deleted DB at {DB_PATH}")
+        if os.path.exists(numpy_index.INDEX_DIR):
+            shutil.rmtree(numpy_index.INDEX_DIR)
+            print(f"Deleted vector index at {numpy_index.INDEX_DIR}")
+        lexical_index.reset()
+        retrieval_cache.get_cache().bump_version("brain reset")
             
         # 2. Delete Brain Config
         if os.path.exists(BRAIN_CONFIG_PATH):
@@ -604,6 +1771,12 @@ def reset_brain():
         print(f"Error resetting brain: {e}")
         return False
         
+def brain_config_version(brain_config):
+    """Short content hash of a brain config; changes whenever the config does."""
+    if not brain_config:
+        return "none"
+    return generation_cache.make_key(brain_config)[:12]
+
 def load_brain_config():
     """Load the brain_config.json if it exists."""
     if os.path.exists(BRAIN_CONFIG_PATH):
@@ -644,8 +1817,8 @@ def generate_synthetic_essays(exemplar_text, subject_list=None):
     if not api_key:
         return [("error", "GEMINI_API_KEY not set")]
     
-    client = genai.Client(api_key=api_key)
-    config = types.GenerateContentConfig(temperature=0.6)
+    client = gemini_client.get_client()
+    config = gemini_client.build_config(temperature=0.6)
     
     results = []
     
@@ -712,7 +1885,7 @@ def analyze_essay_structure(text):
         print("Warning: GEMINI_API_KEY not set. Skipping analysis.")
         return text
 
-    client = genai.Client(api_key=api_key)
+    client = gemini_client.get_client()
     
     prompt = f"""Analyze this UCAS Personal Statement. 
     Extract its [Structural Blueprint] (e.g., Hook -> Academic Evidence -> Supercurricular -> Conclusion) and its [Key Themes].
@@ -733,18 +1906,63 @@ def analyze_essay_structure(text):
         print(f"Error analyzing essay: {e}")
         return text
 
+def index_new_chunks(vectorstore, ids, chunks):
+    """
+    Keeps the retrieval cache version, the BM25 index and the NumPy index (if
+    one has been exported, whatever this process's RETRIEVAL_MODE) in step
+    with Chroma after an add. The cache version is bumped last: a search keyed
+    on the new version must already read the updated indexes.
+    """
+    collection = vectorstore._collection
+    try:
+        lexical_index.add_chunks(lambda: collection, ids, [c.page_content for c in chunks],
+                                 [c.metadata for c in chunks])
+        # NumpyVectorStore.add_documents has already re-exported
+        if os.path.exists(numpy_index.INDEX_DIR) and not isinstance(vectorstore, numpy_index.NumpyVectorStore):
+            numpy_index.export_index(collection)
+    finally:
+        retrieval_cache.get_cache().bump_version(f"ingested {len(ids)} chunks")
+
+def retag_collection():
+    """
+    Tags every stored chunk with essay_type / subject_family / section (for
+    chunks ingested before tagging), then rebuilds the indexes that copy metadata.
+    """
+    collection = get_collection()
+    data = collection.get(include=["documents", "metadatas"])
+    by_source = {}
+    for chunk_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+        doc = Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+        by_source.setdefault(doc.metadata.get("source", ""), []).append(doc)
+    for source, docs in by_source.items():
+        docs.sort(key=lambda doc: doc.metadata.get("start_index", 0))
+        corpus_tags.tag_chunks(docs, os.path.basename(source))
+        collection.update(ids=[doc.id for doc in docs], metadatas=[doc.metadata for doc in docs])
+    try:
+        lexical_index.save_index(lexical_index.build_from_collection(collection))
+        if os.path.exists(numpy_index.INDEX_DIR):
+            numpy_index.export_index(collection)
+    finally:
+        # After the rebuilds, so results cached under the new version come from them
+        retrieval_cache.get_cache().bump_version("retagged chunks")
+    print(f"Tagged {len(data['ids'])} chunks from {len(by_source)} sources")
+    return len(data["ids"])
+
 def ingest_essay(pdf_path):
     """
-    Ingests a single file (PDF or DOCX) into the vector database.
+    Ingests a single file (PDF, DOCX or a synthetic-essay TXT) into the vector database.
     """
     print(f"Ingesting {pdf_path}...")
     # Reuse logic from ingest_essays.py, but for a single file we can just use the same loader
     # The load_pdfs function expects a directory, so we can adapt or just import the loader directly
-    from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
+    from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
     
     try:
         if pdf_path.lower().endswith('.docx'):
             loader = Docx2txtLoader(pdf_path)
+        elif pdf_path.lower().endswith('.txt'):
+            # Synthetic essays from save_synthetic_essays
+            loader = TextLoader(pdf_path, encoding="utf-8")
         else:
             loader = PyPDFLoader(pdf_path)
             
@@ -758,15 +1976,16 @@ def ingest_essay(pdf_path):
         # Re-wrap as a Document object (simplest way to reuse split_text logic)
         # Note: split_text expects a list of Documents. 
         # We'll create a single enriched document.
-        from langchain_core.documents import Document
         enriched_doc = Document(page_content=enriched_text, metadata={"source": pdf_path})
         
         chunks = split_text([enriched_doc])
+        corpus_tags.tag_chunks(chunks, os.path.basename(pdf_path), full_text)
         if chunks:
             # Use the persistent vectorstore directly instead of store_in_chroma
             print("Adding chunks to persistent vectorstore...")
             vectorstore = get_vectorstore()
-            vectorstore.add_documents(chunks)
+            ids = vectorstore.add_documents(chunks)
+            index_new_chunks(vectorstore, ids, chunks)
             # ChromaDB 0.4+ with PersistentClient auto-persists, but let's verify
             print(f"DEBUG: Auto-persisting... DB should be at {DB_PATH}")
             return f"Successfully ingested {len(chunks)} enriched chunks from {os.path.basename(pdf_path)}."
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Embedding backend benchmark: PyTorch vs ONNX fp32 vs ONNX int8 MiniLM.
+
+Each backend runs in its own subprocess (so peak memory is its own) and
+embeds every chunk stored in the college_essays collection. Reported per
+backend: model load time, throughput (chunks/sec), peak RSS, and cosine
+agreement with the vectors already in the collection (written by the
+PyTorch model at ingest) and with this run's PyTorch vectors.
+The report is printed and written to bench_embeddings_output.txt.
+
+Usage:
+    python bench_embeddings.py                     # all backends
+    python bench_embeddings.py onnx onnx-int8      # a subset
+    EMBEDDING_THREADS=4 python bench_embeddings.py
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_PATH = os.path.join(BASE_DIR, "bench_embeddings_output.txt")
+BACKENDS = {
+    "torch": {"EMBEDDING_BACKEND": "torch"},
+    "onnx": {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_ONNX_INT8": "off"},
+    "onnx-int8": {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_ONNX_INT8": "on"},
+}
+
+
+def load_corpus():
+    import chromadb
+    client = chromadb.PersistentClient(path=os.path.join(BASE_DIR, "chroma_db"))
+    data = client.get_collection("college_essays").get(include=["documents", "embeddings"])
+    return data["documents"], np.asarray(data["embeddings"], dtype=np.float32)
+
+
+def worker(name, out_path):
+    """Runs inside the subprocess: embed the corpus with one backend and save the vectors."""
+    import embedding_models
+    documents, _ = load_corpus()
+    start = time.perf_counter()
+    embeddings = embedding_models.load_embeddings()
+    load_seconds = time.perf_counter() - start
+    embeddings.embed_documents(documents[:8])  # warm-up batch
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(documents), dtype=np.float32)
+    seconds = time.perf_counter() - start
+    np.save(out_path, vectors)
+    print(json.dumps({
+        "load_s": load_seconds,
+        "chunks_per_s": len(documents) / seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def cosine_rows(a, b):
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    names = [a for a in sys.argv[1:] if a in BACKENDS] or list(BACKENDS)
+    documents, stored = load_corpus()
+    if not documents:
+        print("Collection is empty, nothing to benchmark.")
+        return
+    threads = os.environ.get("EMBEDDING_THREADS", "0")
+    lines = [f"Embedding benchmark: {len(documents)} chunks, EMBEDDING_THREADS={threads}", ""]
+    vectors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            out_path = os.path.join(tmp, f"{name}.npy")
+            env = dict(os.environ, **BACKENDS[name])
+            proc = subprocess.run([sys.executable, __file__, "--worker", name, out_path],
+                                  env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                lines.append(f"{name:10s} FAILED: {proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode}")
+                continue
+            stats = json.loads(proc.stdout.strip().splitlines()[-1])
+            vectors[name] = np.load(out_path)
+            agreement = cosine_rows(vectors[name], stored)
+            lines.append(f"{name:10s} load {stats['load_s']:5.1f} s  {stats['chunks_per_s']:7.1f} chunks/s  "
+                         f"peak RSS {stats['peak_rss_mb']:6.0f} MB  cosine vs stored "
+                         f"mean {agreement.mean():.5f} min {agreement.min():.5f}")
+    if "torch" in vectors:
+        lines.append("")
+        for name in vectors:
+            if name != "torch":
+                agreement = cosine_rows(vectors[name], vectors["torch"])
+                lines.append(f"{name} vs torch: cosine mean {agreement.mean():.5f} min {agreement.min():.5f}")
+
+    report = "\n".join(lines)
+    print(report)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    print(f"\nSaved to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Grammar pass benchmark: local corrector vs the LLM grammar pass.
+
+Runs both engines over the paragraphs of the saved outputs (test_output.txt,
+ultra_human_output.txt) plus EDGE_CASES, and reports latency plus word-level
+edit agreement (how many of the local edits the LLM also made, and vice
+versa). EDGE_CASES are already correct: any local edit to them is reported.
+The report is printed and written to bench_output.txt.
+
+Usage:
+    python bench_grammar.py             # local + LLM (needs GEMINI_API_KEY, or LLM_MODE=replay)
+    python bench_grammar.py --local     # local corrector only
+"""
+import difflib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import grammar_local
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = ["test_output.txt", "ultra_human_output.txt"]
+OUTPUT_PATH = os.path.join(BASE_DIR, "bench_output.txt")
+LOCAL_REPEATS = 20
+# Correct text the local rules once got wrong (abbreviations, acronyms, numbers)
+EDGE_CASES = [
+    "I volunteered at the food bank until 3 p.m. then I studied economics at the library every evening.",
+    "During the summer I woke at 5 a.m. and then revised mechanics before my shift at the warehouse.",
+    "My mentor, who has a Ph.D. in physics and a B.Sc. in mathematics, showed me how to plan experiments.",
+    "I read about an mRNA vaccine trial and an MSc project that used an LLM-based tool to sort an X-ray archive.",
+    "We ran the simulation 10 10 times a day, so 100 runs in total, and an F grade turned into an A by June.",
+]
+
+
+def load_paragraphs():
+    paragraphs = []
+    for name in SAMPLES:
+        path = os.path.join(BASE_DIR, name)
+        if not os.path.exists(path):
+            print(f"WARNING: {name} not found, skipping")
+            continue
+        with open(path, encoding="utf-8") as f:
+            for paragraph in f.read().split("\n\n"):
+                if len(paragraph.strip()) >= 50:
+                    paragraphs.append((name, paragraph.strip()))
+    paragraphs += [("edge case", text) for text in EDGE_CASES]
+    return paragraphs
+
+
+def word_edits(original, corrected):
+    """Set of word-level edits (position, old words, new words) between two texts."""
+    a, b = original.split(), corrected.split()
+    edits = set()
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes():
+        if tag != "equal":
+            edits.add((i1, tuple(a[i1:i2]), tuple(b[j1:j2])))
+    return edits
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    local_only = "--local" in sys.argv
+    paragraphs = load_paragraphs()
+    if not paragraphs:
+        print("No sample text to benchmark.")
+        return
+
+    corrector = grammar_local.get_corrector()
+    client = None
+    if not local_only:
+        import backend
+        client = backend.gemini_client.get_client()
+
+    lines = [f"Grammar pass benchmark: {len(paragraphs)} paragraphs from {', '.join(SAMPLES)}", ""]
+    local_times, llm_times = [], []
+    agree_total = local_total = llm_total = escalated = 0
+    edge_changed = []
+
+    for i, (source, text) in enumerate(paragraphs):
+        timings = []
+        for _ in range(LOCAL_REPEATS):
+            start = time.perf_counter()
+            local_text, info = corrector.correct(text)
+            timings.append(time.perf_counter() - start)
+        local_times.append(statistics.median(timings))
+        local_edits = word_edits(text, local_text)
+        escalated += info["escalate"]
+        if source == "edge case" and local_text != text:
+            edge_changed.append(f"  {text!r} -> {local_text!r}")
+        row = (f"[{i}] {source} ({len(text)} chars): local {local_times[-1] * 1000:.2f} ms, "
+               f"{len(local_edits)} edits, escalate={info['escalate']}")
+
+        if client is not None:
+            start = time.perf_counter()
+            llm_text = backend.llm_grammar_check(text, client)
+            llm_times.append(time.perf_counter() - start)
+            llm_edits = word_edits(text, llm_text)
+            agreed = len(local_edits & llm_edits)
+            agree_total += agreed
+            local_total += len(local_edits)
+            llm_total += len(llm_edits)
+            row += f" | llm {llm_times[-1] * 1000:.0f} ms, {len(llm_edits)} edits, {agreed} shared"
+        lines.append(row)
+
+    lines += ["", "SUMMARY",
+              f"local p50 {percentile(local_times, 50) * 1000:.2f} ms, p99 {percentile(local_times, 99) * 1000:.2f} ms, "
+              f"escalations {escalated}/{len(paragraphs)}",
+              f"edge cases left unchanged by the local pass: {len(EDGE_CASES) - len(edge_changed)}/{len(EDGE_CASES)}"]
+    lines += edge_changed
+    if client is not None:
+        lines.append(f"llm   p50 {percentile(llm_times, 50) * 1000:.0f} ms, p99 {percentile(llm_times, 99) * 1000:.0f} ms")
+        precision = agree_total / local_total if local_total else 1.0
+        recall = agree_total / llm_total if llm_total else 1.0
+        lines.append(f"edit agreement: {agree_total} shared edits; local precision vs LLM {precision:.2f}, "
+                     f"recall {recall:.2f} ({local_total} local / {llm_total} LLM edits)")
+
+    report = "\n".join(lines)
+    print(report)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    print(f"\nSaved to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
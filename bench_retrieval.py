@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark: Chroma (HNSW) vs the memory-mapped NumPy index, plus
+the hybrid BM25 + dense path.
+
+Exports the college_essays collection to float32 and float16 indexes in a
+temporary directory, then runs the same queries through Chroma and both
+indexes. Queries are the stored chunk embeddings themselves (no embedding
+model needed) plus, when the MiniLM model loads, a few student-style text
+queries. Reports p50/p99 search latency and recall@k against exact search.
+The report is printed and written to bench_retrieval_output.txt.
+
+Usage:
+    python bench_retrieval.py            # k=20 (retrieve_exemplars' candidate count)
+    python bench_retrieval.py --k 5
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import lexical_index
+import numpy_index
+import retrieval
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_PATH = os.path.join(BASE_DIR, "bench_retrieval_output.txt")
+REPEATS = 5
+TEXT_QUERIES = [
+    "Economics I want to understand why markets fail",
+    "Computer Science algorithms and building software",
+    "Medicine volunteering at a hospital and patient care",
+    "Law justice and debating",
+    "personal statement motivation academic",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def timed(fn, repeats=REPEATS):
+    """(median seconds, result) over `repeats` runs."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2], result
+
+
+def main():
+    k = int(sys.argv[sys.argv.index("--k") + 1]) if "--k" in sys.argv else 20
+    import backend
+    collection = backend.get_vectorstore_client().get_collection("college_essays")
+    data = collection.get(include=["embeddings", "documents"])
+    queries = [np.asarray(v, dtype=np.float32) for v in data["embeddings"]]
+    # Lexical side of the hybrid row: the opening of each chunk stands in for the query text
+    query_texts = [(text or "")[:300] for text in data["documents"]]
+    if not queries:
+        print("Collection is empty, nothing to benchmark.")
+        return
+    k = min(k, len(queries))
+
+    text_vectors = []
+    try:
+        embeddings = backend.get_embedding_function()
+        text_vectors = [np.asarray(embeddings.embed_query(q), dtype=np.float32) for q in TEXT_QUERIES]
+    except Exception as e:
+        print(f"WARNING: embedding model unavailable, text queries skipped: {e}")
+    queries += text_vectors
+    query_texts += TEXT_QUERIES[:len(text_vectors)]
+
+    lines = [f"Retrieval benchmark: {collection.count()} chunks, {len(queries)} queries "
+             f"({len(text_vectors)} text), k={k}, median of {REPEATS} runs each", ""]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        indexes = {}
+        for dtype in ("float32", "float16"):
+            index_dir = os.path.join(tmp, dtype)
+            start = time.perf_counter()
+            numpy_index.export_index(collection, index_dir, dtype)
+            export_seconds = time.perf_counter() - start
+            indexes[dtype] = numpy_index.load_index(index_dir)
+            size = sum(os.path.getsize(os.path.join(index_dir, f)) for f in os.listdir(index_dir))
+            lines.append(f"export {dtype}: {export_seconds * 1000:.0f} ms, {size / 1024:.0f} KiB on disk")
+        lines.append("")
+
+        exact = [set(row for row, _ in indexes["float32"].search(q, k)) for q in queries]
+        engines = {
+            "chroma": lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k,
+                                                 include=["documents", "metadatas", "distances"]),
+            # Includes reading the chunk texts, as similarity_search does
+            "numpy float32": lambda q: [(row, indexes["float32"].text(row)) for row, _ in indexes["float32"].search(q, k)],
+            "numpy float16": lambda q: [(row, indexes["float16"].text(row)) for row, _ in indexes["float16"].search(q, k)],
+        }
+        rows_by_id = {chunk_id: row for row, chunk_id in enumerate(indexes["float32"].ids)}
+        for name, search in engines.items():
+            timings, recalls = [], []
+            for query, truth in zip(queries, exact):
+                seconds, result = timed(lambda: search(query))
+                timings.append(seconds)
+                if name == "chroma":
+                    found = {rows_by_id[i] for i in result["ids"][0]}
+                else:
+                    found = {row for row, _ in result}
+                recalls.append(len(found & truth) / k)
+            lines.append(f"{name:14s} p50 {percentile(timings, 50) * 1000:7.3f} ms  "
+                         f"p99 {percentile(timings, 99) * 1000:7.3f} ms  recall@{k} {np.mean(recalls):.3f}")
+
+        # Hybrid (RETRIEVAL_MODE=hybrid): BM25 + exact dense + RRF, documents included.
+        # Recall against dense-only search is not meaningful here, so only latency is shown.
+        bm25 = lexical_index.build_from_collection(collection)
+        index = indexes["float32"]
+
+        def hybrid(query, text):
+            dense = [index.ids[row] for row, _ in index.search(query, k)]
+            lexical = [chunk_id for chunk_id, _ in bm25.search(text, k)]
+            fused = retrieval.reciprocal_rank_fusion([dense, lexical])[:k]
+            return [index.document(index.rows[chunk_id]) for chunk_id in fused]
+
+        timings = [timed(lambda: hybrid(query, text))[0] for query, text in zip(queries, query_texts)]
+        lines.append(f"{'hybrid bm25+np':14s} p50 {percentile(timings, 50) * 1000:7.3f} ms  "
+                     f"p99 {percentile(timings, 99) * 1000:7.3f} ms")
+
+    report = "\n".join(lines)
+    print(report)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    print(f"\nSaved to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
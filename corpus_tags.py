@@ -0,0 +1,131 @@
+"""
+Ingest-time tagging of chunks for partitioned retrieval.
+
+tag_chunks() adds three metadata fields to each chunk of one source file:
+  essay_type      - ucas | sop | common_app | other
+  subject_family  - one of SUBJECT_FAMILIES, or "general"
+  section         - q1 | q2 | q3 for UCAS answers (from the question headers),
+                    "analysis" for the AI summary prepended at ingest, else "body"
+A file can hold several essays (each starting at the Q1 header), so the
+subject is decided per essay from its own text, with the file name as a hint.
+Everything is keyword rules: no API calls, deterministic, and the same
+classify_subject() maps a student's target course to its partition.
+"""
+import re
+
+SUBJECT_FAMILIES = {
+    "economics_finance": r"econom\w*|financ\w*|accounts?|accounting|banking|investment\w*|actuar\w*",
+    "business": r"business\w*|management|marketing|entrepreneur\w*|commerce|mnagement|marketiing",
+    "law": r"law|laws|legal|jurisprud\w*|criminolog\w*|barrister|solicitor",
+    "stem": r"mathemat\w*|maths|physics|engineer\w*|engeneering|computer science|computing|chemistry|"
+            r"aerospace|aeronaut\w*|data science|statistics",
+    "medicine_health": r"medicine|medical|health|biolog\w*|biomedical|nursing|dentistry|pharmac\w*|"
+                       r"neuroscience",
+    "social_humanities": r"psycholog\w*|pyschology|history|politics|philosophy|sociolog\w*|geography|"
+                         r"international relations|english literature|anthropolog\w*",
+}
+_FAMILY_PATTERNS = {family: re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+                    for family, pattern in SUBJECT_FAMILIES.items()}
+FILENAME_WEIGHT = 5  # a subject in the file name ("ucas law.pdf") outweighs a few passing mentions
+
+UCAS_HEADERS = [
+    ("q1", re.compile(r"why\s+do\s+you\s+want\s+to\s+study\s+this\s+course", re.IGNORECASE)),
+    ("q2", re.compile(r"how\s+have\s+your\s+qualifications\s+and\s+studies", re.IGNORECASE)),
+    ("q3", re.compile(r"what\s+else\s+have\s+you\s+done\s+to\s+prepare", re.IGNORECASE)),
+]
+_SOP = re.compile(r"\bsop\b|statement\s+of\s+purpose", re.IGNORECASE)
+_COMMON_APP = re.compile(r"common[\s_-]*app|supplement\w*|\b\d{3}\s+words\b", re.IGNORECASE)
+_ANALYSIS_MARKER = "[AI ANALYSIS:"
+
+
+def classify_subject(text, filename=""):
+    """Subject family with the most keyword hits (file name weighted up), or 'general'."""
+    scores = {}
+    for family, pattern in _FAMILY_PATTERNS.items():
+        score = len(pattern.findall(text or "")) + FILENAME_WEIGHT * len(pattern.findall(filename or ""))
+        if score:
+            scores[family] = score
+    return max(scores, key=scores.get) if scores else "general"
+
+
+def classify_essay_type(text, filename=""):
+    has_ucas_headers = any(pattern.search(text) for _, pattern in UCAS_HEADERS)
+    if has_ucas_headers or "ucas" in filename.lower():
+        return "ucas"
+    if _SOP.search(filename) or _SOP.search(text[:2000]):
+        return "sop"
+    if _COMMON_APP.search(filename) or _COMMON_APP.search(text[:2000]):
+        return "common_app"
+    return "other"
+
+
+def _headers(text):
+    """[(position, section)] of the UCAS question headers in `text`, in order."""
+    found = [(m.start(), section) for section, pattern in UCAS_HEADERS for m in pattern.finditer(text)]
+    return sorted(found)
+
+
+def tag_chunks(chunks, filename="", full_text=None):
+    """
+    Adds essay_type / subject_family / section to the metadata of the chunks of
+    one file (in document order). `full_text` is the original document text,
+    used for the essay type; defaults to the joined chunks. Returns the chunks.
+    """
+    texts = [c.page_content for c in chunks]
+    essay_type = classify_essay_type(full_text if full_text is not None else "\n".join(texts), filename)
+
+    # Pass 1: section per chunk, and which essay (split at each Q1 header) it belongs to
+    section, essay = None, 0
+    sections, essays = [], []
+    previous_q1 = []
+    for text in texts:
+        headers = _headers(text)
+        # Neighbouring chunks overlap, so the same Q1 header can show up twice
+        q1_snippets = [text[position:position + 100] for position, name in headers if name == "q1"]
+        new_q1 = [snippet for snippet in q1_snippets
+                  if not any(snippet.startswith(old) or old.startswith(snippet) for old in previous_q1)]
+        previous_q1 = q1_snippets
+        # A chunk belongs to the section it is mostly in: a header in its first half takes over
+        label = section
+        for position, name in headers:
+            if position < len(text) / 2:
+                label = name
+        if _ANALYSIS_MARKER in text and (not headers or text.find(_ANALYSIS_MARKER) < headers[0][0]):
+            label = "analysis"
+        if new_q1 and section is not None:
+            essay += 1
+        sections.append(label or "body")
+        essays.append(essay)
+        if headers:
+            section = headers[-1][1]
+
+    # Pass 2: subject per essay from its own text
+    essay_texts = {}
+    for text, index in zip(texts, essays):
+        essay_texts[index] = essay_texts.get(index, "") + "\n" + text
+    subjects = {index: classify_subject(text, filename) for index, text in essay_texts.items()}
+
+    for chunk, label, index in zip(chunks, sections, essays):
+        chunk.metadata = dict(chunk.metadata or {})
+        chunk.metadata.update(essay_type=essay_type, subject_family=subjects[index],
+                              section=label if essay_type == "ucas" or label == "analysis" else "body")
+    return chunks
+
+
+def partition_filters(target_course, essay_type="ucas"):
+    """
+    Chroma where-filters from narrowest to broadest: subject + essay type, then
+    essay type alone. The caller falls back to an unfiltered search after these.
+    """
+    family = classify_subject(target_course or "")
+    filters = []
+    if family != "general":
+        filters.append({"$and": [{"essay_type": essay_type}, {"subject_family": family}]})
+    filters.append({"essay_type": essay_type})
+    return filters
+
+
+if __name__ == "__main__":
+    # Tag chunks ingested before tagging existed
+    import backend
+    backend.retag_collection()
@@ -0,0 +1,187 @@
+"""
+Bounded LRU cache of text embeddings.
+
+Every /generate embeds "<course> <motivation>" and app.py embeds the same
+fixed Stage 1 query on every run; with the cache in front of the embedding
+model, a repeated text skips the CPU forward pass. Keys are SHA-256 hashes of
+(model, kind, text); vectors are held as float32 arrays in an in-memory LRU
+bounded by EMBEDDING_CACHE_MAX_ENTRIES.
+
+With EMBEDDING_CACHE_PERSIST=on, entries are also written through to a SQLite
+file (EMBEDDING_CACHE_DB), so a restarted process or a second worker starts warm.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from sqlite_store import SQLiteStore, evict_lru
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+CACHE_PERSIST = os.environ.get("EMBEDDING_CACHE_PERSIST", "off").lower() == "on"
+CACHE_DB = os.environ.get("EMBEDDING_CACHE_DB", os.path.join(BASE_DIR, ".embedding_cache.sqlite3"))
+CACHE_DB_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_DB_MAX_ENTRIES", "50000"))
+
+
+def make_key(namespace, kind, text):
+    return hashlib.sha256(f"{namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, persist=CACHE_PERSIST, db_path=CACHE_DB,
+                 db_max_entries=CACHE_DB_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.persist = persist
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "seconds_embedding": 0.0}
+        self._db = None
+        if self.persist:
+            self._db = SQLiteStore(db_path, schema=[
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " key TEXT PRIMARY KEY, vector BLOB, last_access REAL)",
+                "CREATE INDEX IF NOT EXISTS vectors_lru ON vectors (last_access)",
+            ])
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _remember(self, key, vector):
+        """Insert into the in-memory LRU (caller holds the lock)."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+        while len(self._entries) > self.max_entries:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.stats["evictions"] += 1
+
+    def get_many(self, keys):
+        """{key: vector} for the keys that are cached (memory first, then disk)."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+            self.stats["hits"] += len(found)
+        missing = [key for key in keys if key not in found]
+        if self.persist and missing:
+            conn = self._db.connect()
+            rows = []
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                rows += conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+            if rows:
+                conn.executemany("UPDATE vectors SET last_access = ? WHERE key = ?",
+                                 [(time.time(), key) for key, _ in rows])
+            with self._lock:
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    found[key] = vector
+                self.stats["disk_hits"] += len(rows)
+        with self._lock:
+            self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, items, seconds=0.0):
+        """Stores {key: vector}; `seconds` is the model time spent computing them."""
+        items = {key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()}
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            self.stats["seconds_embedding"] += seconds
+        if self.persist and items:
+            now = time.time()
+            conn = self._db.connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), now) for key, vector in items.items()],
+            )
+            evict_lru(conn, "vectors", self.db_max_entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.persist:
+            self._db.connect().execute("DELETE FROM vectors")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["seconds_embedding"] = round(stats["seconds_embedding"], 3)
+        stats["max_entries"] = self.max_entries
+        stats["persist"] = self.persist
+        return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper that serves repeated texts from an EmbeddingCache."""
+
+    def __init__(self, embeddings, cache=None, namespace=None):
+        self.embeddings = embeddings
+        self.cache = cache or get_cache()
+        self.namespace = namespace or getattr(embeddings, "model_name", type(embeddings).__name__)
+
+    def _embed(self, texts, kind):
+        if not self.cache.enabled:
+            if kind == "query":
+                return [self.embeddings.embed_query(texts[0])]
+            return self.embeddings.embed_documents(texts)
+        keys = [make_key(self.namespace, kind, text) for text in texts]
+        found = self.cache.get_many(keys)
+        # Embed each distinct missing text once, in one batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            start = time.perf_counter()
+            if kind == "query":
+                vectors = [self.embeddings.embed_query(text) for text in missing.values()]
+            else:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self.cache.put_many(computed, seconds=time.perf_counter() - start)
+            found.update({key: np.asarray(vector, dtype=np.float32) for key, vector in computed.items()})
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), "document") if texts else []
+
+    def embed_query(self, text):
+        return self._embed([text], "query")[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide embedding cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,174 @@
+"""
+Embedding model backends for all-MiniLM-L6-v2.
+
+EMBEDDING_BACKEND selects how chunks and queries are embedded:
+  torch  - default, sentence-transformers on PyTorch via HuggingFaceEmbeddings
+  onnx   - the exported ONNX graph on onnxruntime (no torch import); with
+           EMBEDDING_ONNX_INT8=on, the dynamically quantized int8 graph
+
+OnnxEmbeddings reproduces the sentence-transformers pipeline (tokenize, mean
+pool over the attention mask, L2 normalise), so fp32 ONNX vectors match the
+vectors already in the collection. int8 vectors agree closely but not exactly;
+`python embedding_models.py --reindex` re-embeds the collection with the
+configured backend so queries and documents come from the same model.
+
+Texts are sorted by token length and packed into batches of at most
+EMBEDDING_BATCH_SIZE texts / EMBEDDING_BATCH_TOKENS padded tokens, so a batch
+of short queries is not padded to the longest chunk. EMBEDDING_THREADS caps the
+CPU threads used by either backend (0 = library default).
+"""
+import os
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # sentence-transformers' max_seq_length for this model
+
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+ONNX_INT8 = os.environ.get("EMBEDDING_ONNX_INT8", "off").lower() == "on"
+# Local directory with model.onnx / model_int8.onnx and tokenizer.json; otherwise
+# the files published in the model's Hugging Face repo are downloaded and cached
+ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "")
+ONNX_HUB_FILES = {False: "onnx/model.onnx", True: "onnx/model_quint8_avx2.onnx"}
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_TOKENS = int(os.environ.get("EMBEDDING_BATCH_TOKENS", "8192"))
+
+
+def _model_files(int8):
+    """(onnx_path, tokenizer_path), local directory first, then the Hugging Face cache."""
+    if ONNX_DIR:
+        return (os.path.join(ONNX_DIR, "model_int8.onnx" if int8 else "model.onnx"),
+                os.path.join(ONNX_DIR, "tokenizer.json"))
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(MODEL_NAME, ONNX_HUB_FILES[int8]), hf_hub_download(MODEL_NAME, "tokenizer.json")
+
+
+def make_batches(lengths, batch_size=EMBEDDING_BATCH_SIZE, batch_tokens=EMBEDDING_BATCH_TOKENS):
+    """Groups text indices (sorted by token length) into batches under both limits."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, current = [], []
+    for i in order:
+        # Sorted ascending, so the newest item sets the padded width
+        if current and (len(current) + 1 > batch_size or (len(current) + 1) * lengths[i] > batch_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, int8=ONNX_INT8, threads=EMBEDDING_THREADS, batch_size=EMBEDDING_BATCH_SIZE,
+                 batch_tokens=EMBEDDING_BATCH_TOKENS, session=None, tokenizer=None):
+        self.int8 = int8
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.model_name = f"{MODEL_NAME}:onnx{'-int8' if int8 else ''}"
+        if session is None or tokenizer is None:
+            import onnxruntime
+            from tokenizers import Tokenizer
+            model_path, tokenizer_path = _model_files(int8)
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+        tokenizer.no_padding()
+        tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.session = session
+        self.tokenizer = tokenizer
+        self.input_names = {i.name for i in session.get_inputs()}
+
+    def _run(self, encodings):
+        width = max(len(e.ids) for e in encodings)
+        ids = np.zeros((len(encodings), width), dtype=np.int64)
+        mask = np.zeros_like(ids)
+        for row, encoding in enumerate(encodings):
+            ids[row, :len(encoding.ids)] = encoding.ids
+            mask[row, :len(encoding.ids)] = 1
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feed)[0]
+        # Mean pooling over real tokens, then L2 normalisation (sentence-transformers' Pooling + Normalize)
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_array(self, texts):
+        """Embeds texts into an (n, 384) float32 array, in input order."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(list(texts))
+        vectors = [None] * len(texts)
+        for batch in make_batches([len(e.ids) for e in encodings], self.batch_size, self.batch_tokens):
+            for i, vector in zip(batch, self._run([encodings[i] for i in batch])):
+                vectors[i] = vector
+        return np.vstack(vectors).astype(np.float32)
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_array([text])[0].tolist()
+
+
+def load_embeddings(backend=None):
+    """Builds the configured embedding model (not cached; see backend.get_embedding_function)."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    start = time.perf_counter()
+    if backend == "onnx":
+        embeddings = OnnxEmbeddings()
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        if EMBEDDING_THREADS:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+        embeddings = HuggingFaceEmbeddings(
+            model_name=MODEL_NAME,  # Explicit repo reduces lookup hangs
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE},
+        )
+    print(f"DEBUG: Loaded {backend} embedding model in {time.perf_counter() - start:.2f}s")
+    return embeddings
+
+
+def reindex_collection(collection, embeddings, batch=256):
+    """Re-embeds every document in a Chroma collection in place. Returns the number updated."""
+    data = collection.get(include=["documents"])
+    ids, documents = data["ids"], data["documents"] or []
+    for i in range(0, len(ids), batch):
+        vectors = embeddings.embed_documents(documents[i:i + batch])
+        collection.update(ids=ids[i:i + batch], embeddings=vectors)
+    return len(ids)
+
+
+def quantize_model(source, target):
+    """Dynamic int8 quantization of a local ONNX export (needs the `onnx` package)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    return target
+
+
+if __name__ == "__main__":
+    import sys
+    if "--quantize" in sys.argv:
+        # python embedding_models.py --quantize  -> writes EMBEDDING_ONNX_DIR/model_int8.onnx
+        if not ONNX_DIR:
+            sys.exit("Set EMBEDDING_ONNX_DIR to the directory holding model.onnx")
+        print(quantize_model(os.path.join(ONNX_DIR, "model.onnx"), os.path.join(ONNX_DIR, "model_int8.onnx")))
+    elif "--reindex" in sys.argv:
+        import backend
+        collection = backend.get_vectorstore_client().get_collection("college_essays")
+        start = time.perf_counter()
+        count = reindex_collection(collection, load_embeddings())
+        print(f"Re-embedded {count} chunks with {EMBEDDING_BACKEND} in {time.perf_counter() - start:.1f}s")
+        if os.path.exists(backend.numpy_index.INDEX_DIR):
+            backend.numpy_index.export_index(collection)
+    else:
+        print(__doc__)
@@ -0,0 +1,157 @@
+"""
+Shared Gemini client layer.
+
+Every backend call goes through one process-wide genai.Client backed by a
+keep-alive httpx connection pool, so requests reuse open TLS connections
+instead of handshaking again for each generate_content call.
+"""
+import os
+import threading
+import time
+
+import httpx
+from google import genai
+from google.genai import types
+
+import llm_backend
+
+# ============================================================================
+# POOL CONFIGURATION (override via environment)
+# ============================================================================
+POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", "10"))
+KEEPALIVE_SECONDS = float(os.environ.get("GEMINI_KEEPALIVE_SECONDS", "120"))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "300"))
+
+DEFAULT_MODEL = "gemini-3-flash-preview"
+GRAMMAR_MODEL = "gemini-2.0-flash"
+
+# Per-model GenerateContentConfig defaults. Explicit arguments to
+# build_config() always win over these.
+MODEL_DEFAULTS = {
+    DEFAULT_MODEL: {},
+    GRAMMAR_MODEL: {"temperature": 0.1},
+}
+
+_lock = threading.Lock()
+_client = None
+_client_key = None
+_http_client = None
+
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
+    "reused_connections": 0,
+    "hold_seconds_total": 0.0,
+    "hold_seconds_max": 0.0,
+    "completed": 0,
+}
+
+
+def _record(new_connection, hold_seconds):
+    with _lock:
+        _stats["completed"] += 1
+        if new_connection:
+            _stats["new_connections"] += 1
+        else:
+            _stats["reused_connections"] += 1
+        _stats["hold_seconds_total"] += hold_seconds
+        _stats["hold_seconds_max"] = max(_stats["hold_seconds_max"], hold_seconds)
+
+
+def _attach_trace(request):
+    """httpx request hook: follow the request through httpcore to see whether
+    it opened a new TCP connection and how long it held its connection."""
+    state = {"new": False, "start": None}
+
+    def trace(event, info):
+        if event == "connection.connect_tcp.complete":
+            state["new"] = True
+        elif event.endswith("send_request_headers.started") and state["start"] is None:
+            state["start"] = time.perf_counter()
+        elif event.endswith("response_closed.complete") and state["start"] is not None:
+            _record(state["new"], time.perf_counter() - state["start"])
+            state["start"] = None
+
+    with _lock:
+        _stats["requests"] += 1
+    request.extensions["trace"] = trace
+
+
+def _build_http_client():
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_SIZE,
+            keepalive_expiry=KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS),
+        event_hooks={"request": [_attach_trace]},
+    )
+
+
+def configure(pool_size=None, keepalive_seconds=None, model_defaults=None):
+    """Adjust pool settings / model defaults. Takes effect on the next get_client()."""
+    global POOL_SIZE, KEEPALIVE_SECONDS
+    with _lock:
+        if pool_size is not None:
+            POOL_SIZE = int(pool_size)
+        if keepalive_seconds is not None:
+            KEEPALIVE_SECONDS = float(keepalive_seconds)
+        if model_defaults:
+            for model, defaults in model_defaults.items():
+                MODEL_DEFAULTS.setdefault(model, {}).update(defaults)
+    close()
+
+
+def get_client():
+    """
+    Returns the shared genai.Client, creating it (and its pool) on first use.
+    In LLM_MODE=record/replay the client is wrapped by llm_backend.
+    """
+    global _client, _client_key, _http_client
+    if llm_backend.is_replay():
+        return llm_backend.wrap_client(None)
+    api_key = os.environ.get("GEMINI_API_KEY")
+    with _lock:
+        if _client is None or _client_key != api_key:
+            if _http_client is not None:
+                _http_client.close()
+            _http_client = _build_http_client()
+            _client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(httpx_client=_http_client),
+            )
+            _client_key = api_key
+            print(f"DEBUG: Gemini client pool ready (size={POOL_SIZE}, keepalive={KEEPALIVE_SECONDS}s)")
+        return llm_backend.wrap_client(_client)
+
+
+def build_config(model=DEFAULT_MODEL, **overrides):
+    """GenerateContentConfig from the model's defaults plus explicit overrides."""
+    params = dict(MODEL_DEFAULTS.get(model, {}))
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return types.GenerateContentConfig(**params)
+
+
+def get_pool_stats():
+    """Connection reuse and hold-time counters since process start."""
+    with _lock:
+        stats = dict(_stats)
+    completed = stats["completed"]
+    stats["reuse_rate"] = round(stats["reused_connections"] / completed, 3) if completed else 0.0
+    stats["hold_seconds_avg"] = round(stats["hold_seconds_total"] / completed, 3) if completed else 0.0
+    stats["hold_seconds_total"] = round(stats["hold_seconds_total"], 3)
+    stats["hold_seconds_max"] = round(stats["hold_seconds_max"], 3)
+    stats["pool_size"] = POOL_SIZE
+    return stats
+
+
+def close():
+    """Drops the shared client and closes its pooled connections."""
+    global _client, _client_key, _http_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _client = None
+        _client_key = None
+        _http_client = None
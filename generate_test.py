@@ -47,10 +47,8 @@ def main():
     
     # Retrieve exemplars directly
     print("\nRetrieving exemplars from vectorstore...")
-    vectorstore = backend.get_vectorstore()
-    docs = vectorstore.similarity_search(TEST_PROFILE, k=5)
-    exemplars = "\n\n---\n\n".join([doc.page_content for doc in docs])
-    print(f"Retrieved {len(docs)} exemplar chunks.\n")
+    exemplars, pack_info = backend.retrieve_exemplars(TEST_PROFILE, max_chunks=5)
+    print(f"Retrieved {pack_info['chunks']} exemplar chunks (~{pack_info['tokens_est']} tokens).\n")
     
     print("=" * 60)
     print("GENERATING ESSAY...")
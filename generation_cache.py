@@ -0,0 +1,143 @@
+"""
+Content-addressed on-disk cache for Gemini generation results.
+
+Opt-in via GENERATION_CACHE:
+  off            - default, every call goes to Gemini
+  on             - read-through cache, entries expire after GENERATION_CACHE_TTL
+  deterministic  - entries never expire; replays of a fixed profile always hit
+                   (for benchmarks and generate_test.py runs)
+
+Keys are SHA-256 hashes of everything that shapes the output (prompt, model,
+temperature, thinking budget, brain_config version). Storage is a bounded
+SQLite file with LRU eviction.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlite_store import SQLiteStore, evict_lru
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.environ.get("GENERATION_CACHE_DB", os.path.join(BASE_DIR, ".generation_cache.sqlite3"))
+CACHE_MODE = os.environ.get("GENERATION_CACHE", "off").lower()
+CACHE_TTL_SECONDS = float(os.environ.get("GENERATION_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_BYTES = int(float(os.environ.get("GENERATION_CACHE_MAX_MB", "64")) * 1024 * 1024)
+CACHE_MAX_ENTRIES = int(os.environ.get("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+
+
+def make_key(*parts, **fields):
+    """Stable hash of the positional parts and keyword fields."""
+    payload = json.dumps({"parts": parts, "fields": fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def config_fingerprint(config):
+    """Serializable view of a GenerateContentConfig (or None) for key building."""
+    if config is None:
+        return None
+    if hasattr(config, "model_dump"):
+        return config.model_dump(mode="json", exclude_none=True)
+    return str(config)
+
+
+class CachedResponse:
+    """Minimal stand-in for a GenerateContentResponse served from the cache."""
+
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+        self.from_cache = True
+
+
+class GenerationCache:
+    def __init__(self, db_path=CACHE_DB, mode=CACHE_MODE, ttl=CACHE_TTL_SECONDS,
+                 max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if self.enabled:
+            self._db = SQLiteStore(db_path, schema=[
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT, size INTEGER,"
+                " created REAL, last_access REAL)",
+                "CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)",
+            ])
+
+    @property
+    def enabled(self):
+        return self.mode in ("on", "deterministic")
+
+    @property
+    def deterministic(self):
+        return self.mode == "deterministic"
+
+    def _count(self, stat, n=1):
+        with self._stats_lock:
+            self.stats[stat] += n
+
+    def get(self, key):
+        """Returns the cached JSON value for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+        conn = self._db.connect()
+        row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (not self.deterministic and now - row[1] > self.ttl):
+            self._count("misses")
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        data = json.dumps(value)
+        now = time.time()
+        conn = self._db.connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), now, now),
+        )
+        self._count("stores")
+        evicted = evict_lru(conn, "entries", self.max_entries, self.max_bytes)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def clear(self):
+        if self.enabled:
+            self._db.connect().execute("DELETE FROM entries")
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["mode"] = self.mode
+        if self.enabled:
+            count, total = self._db.connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            stats["entries"] = count
+            stats["bytes"] = total
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache handle (storage is shared across processes)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GenerationCache()
+        return _cache
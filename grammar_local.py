@@ -0,0 +1,177 @@
+"""
+Local grammar/spelling correction.
+
+LocalCorrector fixes the mechanical errors the LLM grammar pass mostly finds
+(common misspellings, a/an, simple subject-verb agreement, doubled words,
+sentence capitals, spacing around punctuation) in-process, with no network.
+It also reports whether its result can be trusted: too many edits, or words
+it does not recognise, mean the text should go to the LLM pass instead.
+
+Unknown-word detection uses pyspellchecker when it is installed; without it
+only the edit ratio decides escalation.
+"""
+import os
+import re
+
+from length_fitter import ABBREVIATIONS
+
+try:
+    from spellchecker import SpellChecker
+except ImportError:  # optional dependency
+    SpellChecker = None
+
+ESCALATE_EDIT_RATIO = float(os.environ.get("GRAMMAR_ESCALATE_RATIO", "0.03"))
+ESCALATE_UNKNOWN_WORDS = int(os.environ.get("GRAMMAR_ESCALATE_UNKNOWN", "3"))
+
+# Frequent English misspellings -> correct form (British spelling kept as is)
+MISSPELLINGS = {
+    "accomodate": "accommodate", "acheive": "achieve", "acheived": "achieved", "acknowlege": "acknowledge",
+    "adress": "address", "agressive": "aggressive", "alot": "a lot", "apparantly": "apparently",
+    "arguement": "argument", "basicly": "basically", "becuase": "because", "begining": "beginning",
+    "beleive": "believe", "beleived": "believed", "buisness": "business", "calender": "calendar",
+    "catagory": "category", "comittee": "committee", "commited": "committed", "completly": "completely",
+    "concious": "conscious", "definately": "definitely", "definatly": "definitely", "dissapointed": "disappointed",
+    "embarass": "embarrass", "enviroment": "environment", "existance": "existence", "experiance": "experience",
+    "finaly": "finally", "foriegn": "foreign", "goverment": "government", "grammer": "grammar",
+    "harrass": "harass", "immediatly": "immediately", "independant": "independent", "intresting": "interesting",
+    "knowlege": "knowledge", "liase": "liaise", "maintainance": "maintenance", "neccessary": "necessary",
+    "necesary": "necessary", "noticable": "noticeable", "occassion": "occasion", "occured": "occurred",
+    "occurence": "occurrence", "oppurtunity": "opportunity", "persue": "pursue", "posession": "possession",
+    "prefered": "preferred", "priviledge": "privilege", "probaly": "probably", "recieve": "receive",
+    "recieved": "received", "reccomend": "recommend", "recomend": "recommend", "refered": "referred",
+    "relevent": "relevant", "responsability": "responsibility", "rythm": "rhythm", "seperate": "separate",
+    "seperately": "separately", "sucess": "success", "succesful": "successful", "successfull": "successful",
+    "suprise": "surprise", "teh": "the", "thier": "their", "tommorow": "tomorrow", "truely": "truly",
+    "untill": "until", "wich": "which", "wierd": "weird", "writting": "writing", "economcs": "economics",
+    "statisitcs": "statistics", "algorithim": "algorithm", "mathematicas": "mathematics",
+}
+
+# "an" before these vowel-letter words sounds wrong ("a university"); "a" before these consonant-letter ones
+_CONSONANT_SOUND = re.compile(r"^(?:uni|use|usu|uti|eu|one|once|ur[aeio])", re.IGNORECASE)
+_VOWEL_SOUND = re.compile(r"^(?:hour|honest|honou?r|heir|[aeiou])", re.IGNORECASE)
+_AUXILIARIES = {"do", "does", "did", "will", "would", "can", "could", "should", "shall", "might", "may",
+                "must", "to", "let", "make", "made", "help", "helped", "not"}
+
+
+def _keep_case(original, replacement):
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+def _spelled_out(word):
+    """Acronyms, letter names and mixed-case terms ("an MRI", "an mRNA", "an MSc", "an X-ray", "an F")."""
+    if word[:1].isupper() and (len(word) == 1 or not word[1].isalpha()):
+        return True
+    return any(ch.isupper() for ch in word[1:])
+
+
+def _article(match):
+    article, word = match.group(1), match.group(2)
+    if _spelled_out(word):
+        return match.group(0)  # a/an follows how the letters are pronounced
+    wants_an = bool(_VOWEL_SOUND.match(word)) and not _CONSONANT_SOUND.match(word)
+    fixed = "an" if wants_an else "a"
+    return _keep_case(article, fixed) + match.group(0)[len(article):]
+
+
+def _agreement(match):
+    before, subject, verb = match.group(1), match.group(2), match.group(3)
+    if before and before.strip().lower() in _AUXILIARIES:
+        return match.group(0)
+    fixes = {("i", "has"): "have", ("he", "have"): "has", ("she", "have"): "has",
+             ("we", "was"): "were", ("they", "was"): "were", ("you", "was"): "were",
+             ("he", "don't"): "doesn't", ("she", "don't"): "doesn't", ("it", "don't"): "doesn't"}
+    fixed = fixes.get((subject.lower(), verb.lower()))
+    if not fixed:
+        return match.group(0)
+    return match.group(0)[:match.start(3) - match.start(0)] + _keep_case(verb, fixed)
+
+
+def _capitalize(match):
+    before = match.string[:match.start(2)].split()
+    last = before[-1].lower() if before else ""
+    if last in ABBREVIATIONS or last.endswith("..") or match.string[match.end(2):match.end(2) + 1] == ".":
+        return match.group(0)  # "e.g. this", "wait... then", "i.e."
+    return match.group(1) + match.group(2).upper()
+
+
+# (name, pattern, replacement) applied in order; replacement may be a callable
+RULES = [
+    ("whitespace", re.compile(r"[ \t]{2,}"), " "),
+    ("space_after_comma", re.compile(r"([,;])(?=[A-Za-z])"), r"\1 "),
+    ("space_before_punct", re.compile(r"[ \t]+([,.;:!?])(?=\s|$)"), r"\1"),
+    ("double_punct", re.compile(r"(?<!\.)([,;:!?])\1+|(?<!\.)\.\.(?!\.)"), lambda m: m.group(0)[0]),
+    ("repeated_word", re.compile(r"\b([^\W\d_]+)\s+\1\b(?!['’])", re.IGNORECASE),  # words only: "10 10" stays
+     lambda m: m.group(0) if m.group(1).lower() in {"that", "had"} else m.group(1)),
+    ("lowercase_i", re.compile(r"(?<![\w'’-])i(?=['’ ,.!?]|$)(?![.-]\w)"), "I"),
+    ("could_of", re.compile(r"\b(could|should|would|must|might)\s+of\b", re.IGNORECASE), r"\1 have"),
+    ("article", re.compile(r"\b(an?|An?)\s+([A-Za-z][\w-]*)"), _article),
+    ("agreement", re.compile(r"(\b\w+\s+)?\b(I|he|she|it|we|they|you)\s+(has|have|was|don't)\b", re.IGNORECASE),
+     _agreement),
+    ("sentence_capital", re.compile(r"((?:^|[.!?]\s+)[\"'(]?)([a-z])"), _capitalize),
+]
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z'’]*")
+
+
+class LocalCorrector:
+    def __init__(self, misspellings=None, rules=None):
+        self.misspellings = dict(MISSPELLINGS if misspellings is None else misspellings)
+        self.rules = list(RULES if rules is None else rules)
+        self.spell = SpellChecker() if SpellChecker is not None else None
+
+    def _spelling(self, text, edits):
+        def fix(match):
+            word = match.group(0)
+            fixed = self.misspellings.get(word.lower())
+            if not fixed or fixed == word.lower():
+                return word
+            fixed = _keep_case(word, fixed)
+            edits.append(("spelling", word, fixed))
+            return fixed
+        return _WORD.sub(fix, text)
+
+    def unknown_words(self, text):
+        """Words the dictionary does not know (empty without pyspellchecker). Capitalised names are skipped."""
+        if self.spell is None:
+            return []
+        words = [w for w in _WORD.findall(text) if not w[0].isupper() and "'" not in w and "’" not in w]
+        return sorted(self.spell.unknown(words))
+
+    def correct(self, text):
+        """
+        Returns (corrected_text, info). info has the edits made, the unknown
+        words found and `escalate`: True when the LLM pass should check it.
+        """
+        edits = []
+        corrected = self._spelling(text, edits)
+        for name, pattern, replacement in self.rules:
+            def apply(match, name=name, replacement=replacement):
+                new = replacement(match) if callable(replacement) else match.expand(replacement)
+                if new != match.group(0):
+                    edits.append((name, match.group(0), new))
+                return new
+            corrected = pattern.sub(apply, corrected)
+        corrected = corrected.strip()
+
+        words = max(1, len(_WORD.findall(text)))
+        unknown = self.unknown_words(corrected)
+        edit_ratio = len(edits) / words
+        info = {
+            "edits": edits,
+            "edit_ratio": round(edit_ratio, 4),
+            "unknown_words": unknown,
+            "escalate": edit_ratio > ESCALATE_EDIT_RATIO or len(unknown) >= ESCALATE_UNKNOWN_WORDS,
+        }
+        return corrected, info
+
+
+_corrector = None
+
+
+def get_corrector():
+    global _corrector
+    if _corrector is None:
+        _corrector = LocalCorrector()
+    return _corrector
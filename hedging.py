@@ -0,0 +1,213 @@
+"""
+Hedged requests and a circuit breaker for slow / failing model tiers.
+
+Hedger.call() starts the primary attempt; if it has not produced a valid
+answer within the hedge threshold (a fixed number of seconds, or the rolling
+p95 of recent primary latencies) a backup attempt is launched, optionally on a
+faster fallback model. The first valid answer wins and the loser is told to
+cancel. While the primary keeps failing, the breaker opens and calls go
+straight to the fallback tier until a trial call succeeds again.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+HEDGE_AFTER = os.environ.get("HEDGE_AFTER_SECONDS", "p95")  # "p95", a number, or "off"
+HEDGE_DEFAULT_SECONDS = float(os.environ.get("HEDGE_DEFAULT_SECONDS", "45"))
+HEDGE_MIN_SAMPLES = 20
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "60"))
+
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("HEDGE_WORKERS", "16")), thread_name_prefix="hedge")
+
+
+class Cancelled(Exception):
+    """Raised inside an attempt that lost the race and stopped early."""
+
+
+class LatencyTracker:
+    """Rolling window of primary latencies (successes, plus lower bounds for hedges the primary lost)."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open trial after reset_seconds."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """True if the primary may be tried now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_abandoned(self):
+        """The primary lost a hedge race: no verdict, but free the half-open trial slot."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.consecutive_failures >= self.failures:
+                self.opened_at = time.time()
+
+
+class Hedger:
+    def __init__(self, primary, backup, hedge_after=HEDGE_AFTER):
+        self.primary = primary
+        self.backup = backup
+        self.hedge_after = hedge_after
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "backup_wins": 0, "primary_wins": 0,
+                      "fallback_routed": 0, "primary_failures": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def threshold(self):
+        """Seconds to wait on the primary before hedging (None = never hedge)."""
+        if str(self.hedge_after).lower() == "off":
+            return None
+        if str(self.hedge_after).lower() == "p95":
+            if len(self.latency) < HEDGE_MIN_SAMPLES:
+                return HEDGE_DEFAULT_SECONDS
+            return self.latency.percentile(95)
+        return float(self.hedge_after)
+
+    def _run(self, attempt, model, validate):
+        """Runs one attempt; returns (text, model, seconds). Raises on error or invalid output."""
+        cancel = threading.Event()
+        start = time.perf_counter()
+
+        def target():
+            text = attempt(model, cancel)
+            if not validate(text):
+                raise ValueError(f"Invalid response from {model}")
+            return text, model, time.perf_counter() - start
+
+        return _pool.submit(target), cancel
+
+    def call(self, attempt, validate=lambda text: bool(text)):
+        """
+        attempt(model, cancel_event) -> text. Should stop early (raise Cancelled)
+        once cancel_event is set. Returns (text, info).
+        """
+        self._count("calls")
+        info = {"model": None, "hedged": False, "breaker": self.breaker.state}
+
+        if not self.breaker.allow():
+            self._count("fallback_routed")
+            future, _ = self._run(attempt, self.backup, validate)
+            text, info["model"], _ = future.result()
+            return text, info
+
+        primary_start = time.perf_counter()
+        primary, cancel_primary = self._run(attempt, self.primary, validate)
+        done, _ = wait([primary], timeout=self.threshold())
+        if done:
+            try:
+                text, info["model"], seconds = primary.result()
+                self.breaker.record_success()
+                self.latency.add(seconds)
+                self._count("primary_wins")
+                return text, info
+            except Exception as e:
+                print(f"WARNING: Primary {self.primary} failed ({e}); using {self.backup}.")
+                self.breaker.record_failure()
+                self._count("primary_failures")
+                future, _ = self._run(attempt, self.backup, validate)
+                text, info["model"], _ = future.result()
+                return text, info
+
+        # Primary is slow: race a backup against it
+        info["hedged"] = True
+        self._count("hedged")
+        backup, cancel_backup = self._run(attempt, self.backup, validate)
+        pending = {primary, backup}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text, info["model"], seconds = future.result()
+                except Exception as e:
+                    last_error = e
+                    if future is primary:
+                        self.breaker.record_failure()
+                        self._count("primary_failures")
+                    continue
+                if future is primary:
+                    cancel_backup.set()
+                    self.breaker.record_success()
+                    self.latency.add(seconds)
+                    self._count("primary_wins")
+                else:
+                    cancel_primary.set()
+                    # The primary took at least this long; without the sample the p95
+                    # would only see fast primaries and drift down
+                    self.latency.add(time.perf_counter() - primary_start)
+                    self.breaker.record_abandoned()
+                    self._count("backup_wins")
+                return text, info
+        raise last_error
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        threshold = self.threshold()
+        stats["hedge_after_s"] = round(threshold, 3) if threshold is not None else None
+        stats["primary_p95_s"] = self.latency.percentile(95)
+        stats["breaker"] = self.breaker.state
+        stats["primary"] = self.primary
+        stats["backup"] = self.backup
+        return stats
@@ -3,7 +3,7 @@ import glob
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_models import load_embeddings
 
 def load_pdfs(directory_path):
     print(f"Loading PDFs from {directory_path}...")
@@ -38,11 +38,8 @@ def split_text(documents):
 
 def store_in_chroma(chunks, persist_directory="./chroma_db"):
     print("Initializing Vector Database...")
-    # Use a lightweight local embedding model
-    embedding_function = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'}
-    )
+    # Use a lightweight local embedding model (torch or ONNX, per EMBEDDING_BACKEND)
+    embedding_function = load_embeddings()
     
     vectorstore = Chroma.from_documents(
         documents=chunks,
@@ -0,0 +1,157 @@
+"""
+Sentence-level length fitting.
+
+Instead of cutting every section by the same ratio, fit_sections() splits the
+q1/q2/q3 answers into sentences and chooses which whole sentences to drop so
+the essay lands under the character budget as close as possible to the target
+split. Protected sentences (each section's closing sentence, so Q3 keeps its
+"Forward Projection") are never dropped. Per-section reachable lengths come
+from a bitset subset-sum, and a min-plus DP over the total length combines
+every reachable length of every section, so the search is exact and runs
+locally in milliseconds.
+
+The objective is split error (1 per character off each section's share of the
+budget) plus UNUSED_PENALTY per unused budget character, plus SHORT_PENALTY per
+character the essay ends up below `min_total` (the quality gate's "Too short"
+floor), so a fit never trades the floor for a tidier split.
+"""
+import re
+
+import numpy as np
+
+# Abbreviations that end in a full stop without ending the sentence
+ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "u.s.", "u.k.",
+                 "no.", "approx.", "fig.",
+                 # times and degrees ("until 3 p.m. then", "a Ph.D. in")
+                 "a.m.", "p.m.", "ph.d.", "b.sc.", "m.sc.", "b.a.", "m.a.", "m.phil.", "d.phil."}
+
+_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*(\s+)")
+
+UNUSED_PENALTY = 2  # cost per unused budget character, vs 1 per character off the target split
+SHORT_PENALTY = 20  # cost per character below min_total
+
+
+def split_sentences(text):
+    """Splits text into sentences, each keeping its trailing whitespace, so "".join() is lossless."""
+    sentences = []
+    start = 0
+    for match in _BOUNDARY.finditer(text):
+        end = match.end()
+        words = text[start:match.start(1)].split()
+        if not words:
+            continue
+        if words[-1].lower().lstrip("(\"'") in ABBREVIATIONS:
+            continue
+        following = text[end:end + 1]
+        if following and not (following.isupper() or following.isdigit() or following in "\"'("):
+            continue
+        sentences.append(text[start:end])
+        start = end
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def _reachable(lengths):
+    """Bitset of every total reachable by keeping a subset of `lengths`."""
+    bits = 1
+    history = [bits]
+    for length in lengths:
+        bits |= bits << length
+        history.append(bits)
+    return history
+
+
+def _choose(lengths, history, total):
+    """Indices to keep so their lengths sum to `total` (earlier sentences preferred)."""
+    keep = []
+    for i in range(len(lengths) - 1, -1, -1):
+        # Prefer dropping later sentences: keep item i only if the rest can't make the sum without it
+        if not (history[i] >> total) & 1:
+            keep.append(i)
+            total -= lengths[i]
+    return sorted(keep)
+
+
+class _Section:
+    def __init__(self, text, protect_first):
+        text = text.strip()
+        self.units = split_sentences(text)
+        last = len(self.units) - 1
+        self.protected = {last} if last >= 0 else set()
+        if protect_first and last > 0:
+            self.protected.add(0)
+        self.removable = [i for i in range(len(self.units)) if i not in self.protected]
+        self.fixed = sum(len(self.units[i]) for i in self.protected)
+        # The closing sentence has no trailing whitespace, so unit lengths sum to the text length
+        self.lengths = [len(self.units[i]) for i in self.removable]
+        self.history = _reachable(self.lengths)
+
+    def lengths_up_to(self, limit):
+        """Every section length reachable by dropping removable sentences, <= limit."""
+        bits = self.history[-1]
+        return [s + self.fixed for s in range(bits.bit_length()) if (bits >> s) & 1 and s + self.fixed <= limit]
+
+    def render(self, length):
+        kept = set(self.protected)
+        chosen = _choose(self.lengths, self.history, length - self.fixed)
+        kept.update(self.removable[i] for i in chosen)
+        return "".join(self.units[i] for i in sorted(kept)).strip()
+
+
+def _fit(sections, targets, budget, min_total=0):
+    keys = list(sections)
+    if budget < 0:
+        return None
+    target_total = sum(targets.values()) or 1
+    goal = {key: budget * targets[key] / target_total for key in keys}
+
+    # best[t]: lowest split error of the sections so far with combined length t;
+    # choice[i][t]: the length section i takes in that optimum
+    best = np.full(budget + 1, np.inf)
+    best[0] = 0.0
+    choice = []
+    for key in keys:
+        lengths = sections[key].lengths_up_to(budget)
+        if not lengths:
+            return None
+        step = np.full(budget + 1, np.inf)
+        chosen = np.full(budget + 1, -1, dtype=np.int64)
+        for length in lengths:
+            candidate = best[:budget + 1 - length] + abs(length - goal[key])
+            better = candidate < step[length:]
+            step[length:][better] = candidate[better]
+            chosen[length:][better] = length
+        best = step
+        choice.append(chosen)
+
+    totals = np.arange(budget + 1)
+    cost = best + UNUSED_PENALTY * (budget - totals) + SHORT_PENALTY * np.maximum(0, min_total - totals)
+    total = int(np.argmin(cost))
+    if not np.isfinite(cost[total]):
+        return None
+    fitted = {}
+    for key, chosen in zip(reversed(keys), reversed(choice)):
+        length = int(chosen[total])
+        fitted[key] = sections[key].render(length)
+        total -= length
+    return {key: fitted[key] for key in keys}
+
+
+def fit_sections(texts, targets, budget, separator_chars=0, min_total=0):
+    """
+    texts / targets: {section_key: text} and {section_key: target chars}.
+    Returns {section_key: fitted_text} whose combined length plus
+    `separator_chars` is <= budget, or None when even the protected sentences
+    do not fit. Totals below `min_total` (separators included) are penalised.
+    The first sentence of each section is protected too while that still
+    leaves a feasible fit.
+    """
+    budget -= separator_chars
+    min_total -= separator_chars
+    for protect_first in (True, False):
+        sections = {key: _Section(text, protect_first) for key, text in texts.items()}
+        fitted = _fit(sections, targets, budget, min_total)
+        if fitted is not None:
+            return fitted
+    return None
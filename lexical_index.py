@@ -0,0 +1,190 @@
+"""
+Incremental BM25 inverted index over the stored chunks.
+
+Subject terms ("Accounts", "Finance", "Law") are often found better by
+lexical match than by MiniLM semantics. BM25Index keeps term -> {chunk_id: tf}
+postings plus each chunk's length and metadata, keyed by the Chroma chunk ids
+so lexical and dense results can be fused (retrieval.reciprocal_rank_fusion).
+Search only walks the postings of the query's terms.
+
+The index lives in memory and is saved to LEXICAL_INDEX_PATH (JSON) after each
+ingest; other processes reload it when the file changes. It is built from the
+Chroma collection when missing or out of step with the collection count.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from numpy_index import matches
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", os.path.join(BASE_DIR, "lexical_index.json"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "been", "but", "by", "for", "from", "had", "has", "have",
+    "he", "her", "his", "i", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "our", "she",
+    "so", "than", "that", "the", "their", "them", "then", "there", "these", "they", "this", "those", "to",
+    "was", "we", "were", "what", "when", "which", "while", "who", "will", "with", "would", "you", "your",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ers", "er", "ed", "es", "s")
+
+
+def _stem(word):
+    """Crude suffix stripping so 'accounts'/'accounting' and 'economics'/'economic' meet."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class BM25Index:
+    def __init__(self):
+        self.postings = {}    # term -> {chunk_id: term frequency}
+        self.lengths = {}     # chunk_id -> token count
+        self.metadatas = {}   # chunk_id -> metadata
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, ids, texts, metadatas=None):
+        """Adds (or replaces) chunks."""
+        metadatas = metadatas or [{}] * len(ids)
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            if chunk_id in self.lengths:
+                self.remove([chunk_id])
+            counts = {}
+            tokens = tokenize(text or "")
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self.postings.setdefault(token, {})[chunk_id] = tf
+            self.lengths[chunk_id] = len(tokens)
+            self.metadatas[chunk_id] = metadata or {}
+            self.total_length += len(tokens)
+
+    def remove(self, ids):
+        ids = set(ids) & set(self.lengths)
+        if not ids:
+            return
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for chunk_id in ids & posting.keys():
+                del posting[chunk_id]
+            if not posting:
+                del self.postings[term]
+        for chunk_id in ids:
+            self.total_length -= self.lengths.pop(chunk_id)
+            self.metadatas.pop(chunk_id, None)
+
+    def search(self, query, k=20, where=None):
+        """Top-k [(chunk_id, bm25_score)] for the query, best first."""
+        if not self.lengths:
+            return []
+        n = len(self.lengths)
+        avg_length = self.total_length / n or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        if where:
+            scores = {cid: s for cid, s in scores.items() if matches(self.metadatas[cid], where)}
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def to_json(self):
+        return {"postings": self.postings, "lengths": self.lengths, "metadatas": self.metadatas}
+
+    @classmethod
+    def from_json(cls, data):
+        index = cls()
+        index.postings = data["postings"]
+        index.lengths = data["lengths"]
+        index.metadatas = data["metadatas"]
+        index.total_length = sum(index.lengths.values())
+        return index
+
+
+def build_from_collection(collection):
+    start = time.perf_counter()
+    data = collection.get(include=["documents", "metadatas"])
+    index = BM25Index()
+    index.add(data["ids"], data["documents"] or [], data["metadatas"])
+    print(f"DEBUG: Built BM25 index over {len(index)} chunks in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def save_index(index, path=INDEX_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index.to_json(), f)
+    os.replace(tmp, path)
+
+
+_state = {"index": None, "version": None}
+_lock = threading.Lock()
+
+
+def _load(get_collection, path, new_ids=()):
+    """Caller holds _lock. `new_ids` are already in the collection but may not be indexed yet."""
+    version = os.path.getmtime(path) if os.path.exists(path) else None
+    if _state["index"] is not None and version == _state["version"]:
+        return _state["index"]
+    index = None
+    if version is not None:
+        with open(path, encoding="utf-8") as f:
+            index = BM25Index.from_json(json.load(f))
+    collection = get_collection()
+    if index is None or len(index) + len(set(new_ids) - index.lengths.keys()) != collection.count():
+        index = build_from_collection(collection)
+        save_index(index, path)
+        version = os.path.getmtime(path)
+    _state.update(index=index, version=version)
+    return index
+
+
+def get_index(get_collection, path=INDEX_PATH):
+    """
+    Process-wide BM25 index: reloaded when another process saved a newer file,
+    rebuilt from get_collection() when missing or its size disagrees with the
+    collection. The collection is only opened when the file has changed.
+    """
+    with _lock:
+        return _load(get_collection, path)
+
+
+def add_chunks(get_collection, ids, texts, metadatas=None, path=INDEX_PATH):
+    """Incremental update after the chunks were added to the collection: index them and save."""
+    with _lock:
+        index = _load(get_collection, path, new_ids=ids)
+        index.add(ids, texts, metadatas)
+        save_index(index, path)
+        _state["version"] = os.path.getmtime(path)
+    return index
+
+
+def reset(path=INDEX_PATH):
+    with _lock:
+        if os.path.exists(path):
+            os.remove(path)
+        _state.update(index=None, version=None)
+
+
+if __name__ == "__main__":
+    # Rebuild from the app's Chroma collection, e.g. after retrain scripts
+    import backend
+    save_index(build_from_collection(backend.get_vectorstore_client().get_collection("college_essays")))
@@ -0,0 +1,245 @@
+"""
+Pluggable LLM backend: live Gemini, record-to-cassette, or replay-from-cassette.
+
+Selected with LLM_MODE:
+  live    - default, real Gemini calls
+  record  - real Gemini calls, every response appended to the cassette
+  replay  - no network; answers come from the cassette with synthetic latency
+
+The record/replay clients expose the same `client.models.generate_content` /
+`generate_content_stream` surface as genai.Client, so safe_generate_content and
+generate_separated_essay run unchanged on top of them.
+
+Replay latency (LLM_REPLAY_LATENCY):
+  recorded            - sleep for the latency captured at record time (default)
+  none                - no delay
+  fixed:2.5           - constant seconds
+  uniform:1,4         - uniform between bounds
+  lognormal:1.2,0.5   - lognormal(mu, sigma) seconds
+"""
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from generation_cache import make_key, config_fingerprint
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LLM_MODE = os.environ.get("LLM_MODE", "live").lower()
+CASSETTE_PATH = os.environ.get("LLM_CASSETTE", os.path.join(BASE_DIR, "cassettes", "gemini.jsonl"))
+REPLAY_LATENCY = os.environ.get("LLM_REPLAY_LATENCY", "recorded")
+REPLAY_STREAM_CHUNK_CHARS = 80
+
+# Filler used when a schema'd call has no recording to replay
+FILLER_SENTENCES = [
+    "I rebuilt the model three times before the numbers finally matched the textbook.",
+    "My first attempt failed because I had ignored a simple boundary case.",
+    "Reading the paper again, I noticed the author had assumed perfect information.",
+    "At the accountancy firm I checked invoices against a ledger that never quite balanced.",
+    "The debate final forced me to argue the side I disagreed with.",
+    "I logged every error in a notebook and revised the method each week.",
+]
+
+
+def call_key(model, contents, config):
+    return make_key("llm_call", contents, model=model, config=config_fingerprint(config))
+
+
+def schema_of(config):
+    schema = getattr(config, "response_schema", None)
+    if schema is None:
+        return None
+    if hasattr(schema, "model_dump"):
+        return schema.model_dump(mode="json", exclude_none=True)
+    return schema
+
+
+def synthesize_from_schema(schema, rng=random):
+    """Builds a value that satisfies a Gemini response_schema (OBJECT/ARRAY/STRING/...)."""
+    kind = str(schema.get("type", "STRING")).upper()
+    if kind == "OBJECT":
+        props = schema.get("properties", {})
+        return {name: synthesize_from_schema(sub, rng) for name, sub in props.items()}
+    if kind == "ARRAY":
+        return [synthesize_from_schema(schema.get("items", {"type": "STRING"}), rng)]
+    if kind in ("INTEGER", "NUMBER"):
+        return 0
+    if kind == "BOOLEAN":
+        return True
+    sentences = [rng.choice(FILLER_SENTENCES) for _ in range(rng.randint(10, 16))]
+    return " ".join(sentences)
+
+
+def filler_text(target_chars, rng=random):
+    """Filler prose of roughly target_chars (text-in/text-out calls like the grammar pass)."""
+    sentences = []
+    length = 0
+    while length < target_chars:
+        sentence = rng.choice(FILLER_SENTENCES)
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+class ReplayResponse:
+    """Minimal GenerateContentResponse look-alike."""
+
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+def sample_latency(recorded=None, spec=None):
+    spec = spec or REPLAY_LATENCY
+    try:
+        if spec == "none":
+            return 0.0
+        if spec == "recorded":
+            return float(recorded or 0.0)
+        name, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v]
+        if name == "fixed":
+            return values[0]
+        if name == "uniform":
+            return random.uniform(values[0], values[1])
+        if name == "lognormal":
+            return random.lognormvariate(values[0], values[1])
+    except (IndexError, ValueError):
+        pass
+    print(f"WARNING: Unknown LLM_REPLAY_LATENCY '{spec}', using no delay.")
+    return 0.0
+
+
+class Cassette:
+    """Append-only JSONL store of recorded calls."""
+
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.by_key = {}
+        self.by_shape = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        self._cycles = {}
+
+    @staticmethod
+    def _shape(model, has_schema):
+        return f"{model}|{'json' if has_schema else 'text'}"
+
+    def _index(self, entry):
+        self.by_key[entry["key"]] = entry
+        self.by_shape.setdefault(self._shape(entry["model"], entry.get("json")), []).append(entry)
+
+    def record(self, entry):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._index(entry)
+
+    def lookup(self, key, model, has_schema):
+        """Exact match first, then round-robin over recordings of the same model and output type."""
+        with self._lock:
+            if key in self.by_key:
+                return self.by_key[key]
+            shape = self._shape(model, has_schema)
+            entries = self.by_shape.get(shape)
+            if not entries:
+                return None
+            if shape not in self._cycles:
+                self._cycles[shape] = itertools.cycle(entries)
+            return next(self._cycles[shape])
+
+
+class _RecordingModels:
+    def __init__(self, models, cassette):
+        self._models = models
+        self._cassette = cassette
+
+    def _save(self, model, contents, config, text, latency):
+        self._cassette.record({
+            "key": call_key(model, contents, config),
+            "model": model,
+            "json": schema_of(config) is not None,
+            "text": text,
+            "latency_s": round(latency, 3),
+        })
+
+    def generate_content(self, model, contents, config=None):
+        start = time.perf_counter()
+        response = self._models.generate_content(model=model, contents=contents, config=config)
+        self._save(model, contents, config, response.text or "", time.perf_counter() - start)
+        return response
+
+    def generate_content_stream(self, model, contents, config=None):
+        start = time.perf_counter()
+        parts = []
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            parts.append(chunk.text or "")
+            yield chunk
+        self._save(model, contents, config, "".join(parts), time.perf_counter() - start)
+
+
+class _ReplayModels:
+    def __init__(self, cassette):
+        self._cassette = cassette
+
+    def _answer(self, model, contents, config):
+        schema = schema_of(config)
+        entry = self._cassette.lookup(call_key(model, contents, config), model, schema is not None)
+        if entry is not None:
+            return entry["text"], sample_latency(entry.get("latency_s"))
+        if schema is not None:
+            return json.dumps(synthesize_from_schema(schema)), sample_latency()
+        # No recording: answer about as long as the prompt's text (clamped)
+        target = min(max(len(str(contents)) - 200, 200), 2000)
+        return filler_text(target), sample_latency()
+
+    def generate_content(self, model, contents, config=None):
+        text, latency = self._answer(model, contents, config)
+        time.sleep(latency)
+        return ReplayResponse(text)
+
+    def generate_content_stream(self, model, contents, config=None):
+        text, latency = self._answer(model, contents, config)
+        chunks = [text[i:i + REPLAY_STREAM_CHUNK_CHARS] for i in range(0, len(text), REPLAY_STREAM_CHUNK_CHARS)] or [""]
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield ReplayResponse(chunk)
+
+
+class OfflineClient:
+    """Stands in for genai.Client in record/replay modes."""
+
+    def __init__(self, models):
+        self.models = models
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+        return _cassette
+
+
+def is_replay():
+    return LLM_MODE == "replay"
+
+
+def wrap_client(client):
+    """Applies LLM_MODE to a live genai.Client (or None in replay mode)."""
+    if LLM_MODE == "replay":
+        return OfflineClient(_ReplayModels(get_cassette()))
+    if LLM_MODE == "record":
+        return OfflineClient(_RecordingModels(client.models, get_cassette()))
+    return client
@@ -0,0 +1,233 @@
+"""
+In-process exact vector index over a memory-mapped NumPy matrix.
+
+The corpus is a few hundred MiniLM chunks, so one matrix-vector product is
+cheaper than going through langchain_chroma -> chromadb -> SQLite + HNSW.
+export_index() dumps the Chroma collection into VECTOR_INDEX_DIR:
+  vectors.npy   - unit-normalised embeddings (float32 or float16), memory-mapped
+  texts.bin     - all chunk texts as one UTF-8 blob, sliced by offsets.npy
+  meta.json     - ids and metadata per row, plus the manifest
+Chroma stays the system of record. NumpyVectorStore reads from the index and
+sends writes to Chroma, re-exporting afterwards.
+
+Scores match Chroma's default l2 space for unit vectors (distance = 2 - 2 * cosine),
+and `filter` accepts Chroma's where syntax ($and/$or, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin).
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", os.path.join(BASE_DIR, "vector_index"))
+INDEX_DTYPE = os.environ.get("VECTOR_INDEX_DTYPE", "float32").lower()
+
+_OPERATORS = {
+    "$eq": lambda value, arg: value == arg,
+    "$ne": lambda value, arg: value != arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+}
+
+
+def matches(metadata, where):
+    """True when a metadata dict satisfies a Chroma-style where filter."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, arg in condition.items():
+                if op not in _OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                try:
+                    if not _OPERATORS[op](value, arg):
+                        return False
+                except TypeError:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def export_index(collection, index_dir=INDEX_DIR, dtype=INDEX_DTYPE):
+    """Writes a Chroma collection to `index_dir`. Returns the manifest."""
+    start = time.perf_counter()
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    ids = list(data["ids"])
+    embeddings = data["embeddings"]
+    if embeddings is None or len(ids) == 0:
+        dim = 0
+        vectors = np.zeros((0, 0), dtype=dtype)
+    else:
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32)).astype(dtype)
+        dim = vectors.shape[1]
+    encoded = [(text or "").encode("utf-8") for text in data["documents"] or []]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(blob) for blob in encoded])
+
+    os.makedirs(index_dir, exist_ok=True)
+    # Write everything under temporary names, then swap in; meta.json goes last
+    # because readers use its mtime as the index version
+    np.save(os.path.join(index_dir, "vectors.tmp.npy"), vectors)
+    np.save(os.path.join(index_dir, "offsets.tmp.npy"), offsets)
+    with open(os.path.join(index_dir, "texts.bin.tmp"), "wb") as f:
+        f.write(b"".join(encoded))
+    manifest = {"count": len(ids), "dim": dim, "dtype": str(vectors.dtype), "exported_at": time.time()}
+    with open(os.path.join(index_dir, "meta.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump({"manifest": manifest, "ids": ids, "metadatas": data["metadatas"] or [{}] * len(ids)}, f)
+    for name, tmp in (("vectors.npy", "vectors.tmp.npy"), ("offsets.npy", "offsets.tmp.npy"),
+                      ("texts.bin", "texts.bin.tmp"), ("meta.json", "meta.json.tmp")):
+        os.replace(os.path.join(index_dir, tmp), os.path.join(index_dir, name))
+    print(f"DEBUG: Exported {len(ids)} vectors ({manifest['dtype']}) to {index_dir} "
+          f"in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+class NumpyIndex:
+    """Read-only view of an exported index; vectors and texts stay memory-mapped."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        meta_path = os.path.join(index_dir, "meta.json")
+        self.version = os.path.getmtime(meta_path)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.manifest = meta["manifest"]
+        self.ids = meta["ids"]
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self.metadatas = [m or {} for m in meta["metadatas"]]
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+        texts_path = os.path.join(index_dir, "texts.bin")
+        self._texts = np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else b""
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def text(self, row):
+        return bytes(self._texts[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def document(self, row):
+        return Document(page_content=self.text(row), metadata=dict(self.metadatas[row]), id=self.ids[row])
+
+    def _mask(self, where):
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((matches(m, where) for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+            self._masks[key] = mask
+        return mask
+
+    def search(self, vector, k=4, where=None):
+        """Exact top-k by cosine. Returns [(row, cosine)], best first."""
+        if len(self) == 0 or k <= 0:
+            return []
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        scores = self.vectors @ query.astype(self.vectors.dtype)
+        scores = scores.astype(np.float32)
+        if where:
+            scores[~self._mask(where)] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top if scores[row] != -np.inf]
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def load_index(index_dir=INDEX_DIR):
+    """Cached NumpyIndex for `index_dir`, reloaded when a newer export lands (or None if missing)."""
+    meta_path = os.path.join(index_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    version = os.path.getmtime(meta_path)
+    with _index_lock:
+        index = _indexes.get(index_dir)
+        if index is None or index.version != version:
+            index = NumpyIndex(index_dir)
+            _indexes[index_dir] = index
+            print(f"DEBUG: Loaded vector index ({len(index)} vectors, {index.manifest['dtype']}) from {index_dir}")
+        return index
+
+
+def ensure_index(get_collection, index_dir=INDEX_DIR, dtype=INDEX_DTYPE):
+    """The loaded index, exporting it first from get_collection() when none exists yet."""
+    index = load_index(index_dir)
+    if index is None:
+        export_index(get_collection(), index_dir, dtype)
+        index = load_index(index_dir)
+    return index
+
+
+class NumpyVectorStore:
+    """
+    The subset of the LangChain Chroma interface the app uses, served from the
+    NumPy index. Writes and `_collection` go to the wrapped Chroma store.
+    """
+
+    def __init__(self, chroma, embeddings, index_dir=INDEX_DIR, dtype=INDEX_DTYPE):
+        self.chroma = chroma
+        self.embeddings = embeddings
+        self.index_dir = index_dir
+        self.dtype = dtype
+
+    @property
+    def _collection(self):
+        return self.chroma._collection
+
+    def index(self):
+        return ensure_index(lambda: self._collection, self.index_dir, self.dtype)
+
+    def rebuild(self):
+        return export_index(self._collection, self.index_dir, self.dtype)
+
+    def add_documents(self, documents, **kwargs):
+        ids = self.chroma.add_documents(documents, **kwargs)
+        self.rebuild()
+        return ids
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        index = self.index()
+        return [
+            (index.document(row), max(0.0, 2.0 - 2.0 * cosine))
+            for row, cosine in index.search(embedding, k=k, where=filter)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+
+if __name__ == "__main__":
+    # Rebuild the index from the app's Chroma collection, e.g. after retrain scripts
+    import sys
+    import backend
+    collection = backend.get_vectorstore_client().get_collection("college_essays")
+    export_index(collection, dtype="float16" if "--float16" in sys.argv else INDEX_DTYPE)
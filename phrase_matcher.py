@@ -0,0 +1,105 @@
+"""
+Single-pass multi-pattern matcher.
+
+All terms from all categories are compiled into one case-insensitive regex
+built from a character trie (so alternatives share prefixes, like an
+Aho-Corasick automaton), wrapped in a zero-width lookahead so overlapping
+matches are found too. One scan of the text returns match spans per category.
+
+Term options per category:
+  case_sensitive - the text must match the term's exact casing ("Also,")
+  prefix         - the term is a stem; any word continuing it matches
+                   ("debug" matches "debugging")
+Otherwise terms match whole words only, so "realm" never fires inside
+"overwhelmed".
+"""
+import re
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def _trie_pattern(words):
+    """Regex alternation for `words` factored through a character trie (longest first)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class PhraseMatcher:
+    def __init__(self):
+        self._entries = {}  # lowercase term -> [(category, original term, case_sensitive, prefix)]
+        self.categories = []
+        self._regex = None
+
+    def add(self, category, terms, case_sensitive=False, prefix=False):
+        if category not in self.categories:
+            self.categories.append(category)
+        for term in terms:
+            term = str(term).strip()
+            if term:
+                self._entries.setdefault(term.lower(), []).append((category, term, case_sensitive, prefix))
+        self._regex = None
+        return self
+
+    def compile(self):
+        keys = sorted(self._entries)
+        self.max_term_chars = max(map(len, keys), default=0)
+        if keys:
+            pattern = r"(?=(?<!\w)(" + _trie_pattern(keys) + r")(\w*))"
+            self._regex = re.compile(pattern, re.IGNORECASE)
+        # Shorter terms that are word-bounded prefixes of a longer term can start at
+        # the same position; the scan reports the longest, so check these explicitly.
+        self._shadowed = {}
+        for key in keys:
+            for other in keys:
+                if other != key and key.startswith(other):
+                    self._shadowed.setdefault(key, []).append(other)
+        return self
+
+    def _accept(self, text, start, key, trailing, hits):
+        core_end = start + len(key)
+        for category, term, case_sensitive, prefix in self._entries[key]:
+            if case_sensitive and text[start:core_end] != term:
+                continue
+            end = core_end
+            if prefix:
+                end += len(trailing)
+            elif trailing and _is_word_char(key[-1]):
+                continue  # whole-word term ran into more letters
+            hits[category].append((start, end, term))
+
+    def scan(self, text):
+        """Returns {category: [(start, end, term), ...]} for every match in `text`."""
+        if self._regex is None:
+            self.compile()
+        hits = {category: [] for category in self.categories}
+        if self._regex is None:
+            return hits
+        for match in self._regex.finditer(text):
+            start = match.start(1)
+            key = match.group(1).lower()
+            self._accept(text, start, key, match.group(2), hits)
+            for shorter in self._shadowed.get(key, ()):
+                after = start + len(shorter)
+                trailing = ""
+                while after < len(text) and _is_word_char(text[after]):
+                    trailing += text[after]
+                    after += 1
+                self._accept(text, start, shorter, trailing, hits)
+        return hits
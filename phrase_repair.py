@@ -0,0 +1,221 @@
+"""
+Local, deterministic repair of banned words and phrases.
+
+Most quality-gate failures are a single banned token ("landscape", "moreover",
+"I believe that"). PhraseRepairer rewrites those spans from a curated
+replacement table instead of paying for another generation: a replacement
+keeps the original capitalisation and fixes "a"/"an"; an empty replacement
+deletes the term and tidies the commas, spacing and capital letter around it.
+Terms with no table entry are reported as unresolved so the caller can fall
+back to an LLM rewrite.
+"""
+import re
+
+from phrase_matcher import PhraseMatcher
+
+# Lowercase term -> replacement ("" deletes the term)
+REPLACEMENTS = {
+    # Generic AI vocabulary (BANNED_WORDS)
+    "delve": "look",
+    "delve into": "look into",
+    "tapestry": "mix",
+    "unwavering": "steady",
+    "landscape": "field",
+    "testament": "sign",
+    "testament to": "sign of",
+    "underscores": "shows",
+    "paramount": "central",
+    "multifaceted": "complex",
+    "realm": "area",
+    "passionate": "keen",
+    "fostered": "built",
+    "honing": "improving",
+    "meticulous": "careful",
+    "moreover": "",
+    "in conclusion": "",
+    "ignited": "started",
+    "sparked": "started",
+    "pivotal": "key",
+    "transformative": "major",
+    "profound": "real",
+    "invaluable": "useful",
+    "wholeheartedly": "",
+    # Clichés (BANNED_PHRASES)
+    "ever since i was young": "",
+    "from a young age": "",
+    "this experience taught me valuable skills": "this experience taught me practical skills",
+    "i am passionate about": "I enjoy",
+    "i have always been fascinated by": "I have long been interested in",
+    "i have always been fascinated": "I have long been interested",
+    "i want to make a difference": "I want to be useful",
+    "it sparked my interest": "it got me interested",
+    "opened my eyes to": "showed me",
+    "pushed me out of my comfort zone": "was hard for me",
+    "gave me a newfound appreciation": "gave me a new respect",
+    "in today's fast-paced world": "today",
+    "in an ever-changing world": "",
+    "i believe that": "",
+    "it goes without saying": "",
+    "needless to say": "",
+    "at the end of the day": "ultimately",
+    "steered my interest": "turned my interest",
+    "forms the core of": "is central to",
+    "presents a compelling": "makes a strong",
+    "felt like discerning": "felt like spotting",
+    "illuminated the": "showed the",
+    "unveiled the": "showed the",
+    "deciphering the tapestry": "making sense of the mix",
+    "dual perspective": "two views",
+    "inherent irrationality": "built-in irrationality",
+    "bedrock assumptions": "basic assumptions",
+    # Counselor complaints (USER_COMPLAINTS)
+    "driven to": "keen to",
+    "underpinning": "behind",
+    "instilled": "built",
+    "akin to": "like",
+    "demystify": "explain",
+    "power of": "effect of",
+    "drawn to": "interested in",
+    "allure": "appeal",
+    "fascinated by": "interested in",
+    "fascinated": "interested",
+    "deeply": "",
+    "profoundly": "",
+    "framework": "model",
+    "utilize": "use",
+    "leverage": "use",
+    "captivated": "interested",
+    "glimpsing": "seeing",
+    "revealing": "showing",
+    "precise logic": "clear logic",
+    "forms the core of my motivation": "is my main motivation",
+    "forms the core": "is central",
+    "my ambition is": "I aim",
+    "burgeoning": "growing",
+    "illuminated": "showed",
+    "revelation steered": "discovery turned",
+    "beyond mere": "beyond",
+    "intricate calculus": "careful trade-offs",
+    "decode": "work out",
+    "propelling": "pushing",
+    "intersection of": "overlap of",
+    # List transitions (the ChatGPT test)
+    "additionally": "",
+    "furthermore": "",
+    "in addition": "",
+    "also,": "",
+}
+
+_ARROW = re.compile(r"\s*(?:->|=>|→)\s*")
+
+
+def split_anti_pattern(entry):
+    """'leverage -> use' => ('leverage', 'use'); a bare term => (term, None)."""
+    parts = _ARROW.split(entry, maxsplit=1)
+    if len(parts) == 2:
+        return parts[0].strip(), parts[1].strip()
+    return entry, None
+
+
+def replacements_from_anti_patterns(anti_patterns):
+    """
+    Extra table entries from brain_config Anti_Patterns: "term -> replacement"
+    strings (list form, or in Banned_Words) and a {"Replacements": {term: replacement}} dict.
+    """
+    table = {}
+    entries = anti_patterns if isinstance(anti_patterns, list) else []
+    if isinstance(anti_patterns, dict):
+        entries = anti_patterns.get("Banned_Words", [])
+        replacements = anti_patterns.get("Replacements", {})
+        if isinstance(replacements, dict):
+            table.update({str(k).lower(): str(v) for k, v in replacements.items() if str(k).strip()})
+    for entry in entries:
+        if isinstance(entry, str):
+            term, replacement = split_anti_pattern(entry)
+            if term and replacement is not None:
+                table[term.lower()] = replacement
+    return table
+
+
+def _match_case(original, replacement):
+    if not replacement:
+        return replacement
+    if original.isupper() and len(original) > 1:
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+def _fix_article(before, replacement):
+    """Turns a trailing 'a'/'an' in `before` into the right one for `replacement`."""
+    match = re.search(r"\b(a|an|A|An)\s+$", before)
+    if not match or not replacement:
+        return before
+    vowel_sound = replacement[0].lower() in "aeiou" and not replacement.lower().startswith(("use", "uni", "eu", "one"))
+    article = "an" if vowel_sound else "a"
+    if match.group(1)[0].isupper():
+        article = article.capitalize()
+    return before[:match.start(1)] + article + before[match.end(1):]
+
+
+def _delete(before, after):
+    """Joins the text around a deleted term, tidying commas, spaces and capitals."""
+    comma_after = after.startswith(",")
+    if comma_after:
+        after = after[1:]
+    stripped = before.rstrip()
+    if not stripped or stripped[-1] in ".!?\n":
+        after = after.lstrip(" ")
+        return before + after[:1].upper() + after[1:]
+    before = before.rstrip(" ")
+    if comma_after and before.endswith(","):
+        before = before[:-1]
+    if after and not after.startswith((" ", ".", ",", ";", ":", "!", "?")):
+        after = " " + after
+    return before + after
+
+
+class PhraseRepairer:
+    def __init__(self, replacements=None):
+        self.replacements = dict(REPLACEMENTS if replacements is None else replacements)
+        # Table keys may extend a flagged term ("fascinated" -> "fascinated by")
+        self.matcher = PhraseMatcher().add("fix", self.replacements).compile()
+
+    def can_fix(self, term):
+        return term.lower() in self.replacements
+
+    def repair(self, text, spans):
+        """
+        Rewrites the given (start, end, term) spans of `text`, each using the
+        longest table entry that covers it. Overlapping spans resolve to the
+        longest. Returns (new_text, edits, unresolved_terms).
+        """
+        table_hits = self.matcher.scan(text)["fix"]
+        candidates = []
+        unresolved = []
+        for start, end, term in set(spans):
+            covering = [hit for hit in table_hits if hit[0] <= start and hit[1] >= end]
+            if covering:
+                candidates.append(max(covering, key=lambda hit: hit[1] - hit[0]))
+            else:
+                unresolved.append(term)
+
+        chosen = []
+        for start, end, term in sorted(set(candidates), key=lambda s: (s[0], -(s[1] - s[0]))):
+            if chosen and start < chosen[-1][1]:
+                continue
+            chosen.append((start, end, term))
+
+        edits = []
+        for start, end, term in reversed(chosen):
+            original = text[start:end]
+            replacement = _match_case(original, self.replacements[term.lower()])
+            before, after = text[:start], text[end:]
+            if replacement:
+                text = _fix_article(before, replacement) + replacement + after
+            else:
+                text = _delete(before, after)
+            edits.append({"term": term, "from": original, "to": replacement})
+        edits.reverse()
+        return text, edits, sorted(set(unresolved))
@@ -0,0 +1,85 @@
+"""
+Compiled prompt templates.
+
+A template builder renders the expensive, config-dependent part of a prompt
+once per brain_config version, leaving named slots for the per-request text
+(exemplars, student profile). Each request then only splices strings into the
+precompiled segments. Prompt size is tracked so prompt bloat is visible.
+"""
+import threading
+from collections import OrderedDict
+
+from rate_limiter import CHARS_PER_TOKEN
+
+
+def slot(name):
+    """Placeholder a template builder puts where per-request text goes."""
+    return f"\x00slot:{name}\x00"
+
+
+class CompiledPrompt:
+    def __init__(self, template, version, banned_terms=()):
+        self.version = version
+        self.banned_terms = list(banned_terms)
+        self.segments = []  # alternating static text and slot names
+        rest = template
+        while "\x00slot:" in rest:
+            before, _, after = rest.partition("\x00slot:")
+            name, _, rest = after.partition("\x00")
+            self.segments.append(before)
+            self.segments.append(name)
+        self.segments.append(rest)
+        self.static_chars = sum(len(s) for s in self.segments[::2])
+
+    def render(self, **values):
+        parts = []
+        for i, segment in enumerate(self.segments):
+            parts.append(segment if i % 2 == 0 else values.get(segment, ""))
+        return "".join(parts)
+
+
+class PromptCompiler:
+    """Caches CompiledPrompts per brain_config version and records prompt sizes."""
+
+    def __init__(self, build_template, max_versions=8):
+        self.build_template = build_template
+        self.max_versions = max_versions
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"compiles": 0, "renders": 0, "chars_total": 0, "chars_max": 0, "chars_last": 0,
+                      "static_chars_last": 0}
+
+    def get(self, brain_config, version):
+        with self._lock:
+            compiled = self._compiled.get(version)
+            if compiled is not None:
+                self._compiled.move_to_end(version)
+                return compiled
+        template, banned_terms = self.build_template(brain_config)
+        compiled = CompiledPrompt(template, version, banned_terms)
+        with self._lock:
+            self._compiled[version] = compiled
+            while len(self._compiled) > self.max_versions:
+                self._compiled.popitem(last=False)
+            self.stats["compiles"] += 1
+        return compiled
+
+    def render(self, brain_config, version, **values):
+        compiled = self.get(brain_config, version)
+        prompt = compiled.render(**values)
+        with self._lock:
+            self.stats["renders"] += 1
+            self.stats["chars_total"] += len(prompt)
+            self.stats["chars_max"] = max(self.stats["chars_max"], len(prompt))
+            self.stats["chars_last"] = len(prompt)
+            self.stats["static_chars_last"] = compiled.static_chars
+        return prompt
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        renders = stats["renders"]
+        stats["chars_avg"] = round(stats["chars_total"] / renders) if renders else 0
+        for name in ("chars_avg", "chars_max", "chars_last", "static_chars_last"):
+            stats[name.replace("chars", "tokens_est")] = stats[name] // CHARS_PER_TOKEN
+        return stats
@@ -0,0 +1,215 @@
+"""
+Shared token-bucket rate limiter for Gemini calls.
+
+Each model gets two buckets (requests/min and tokens/min). Bucket state lives
+in a small SQLite file so every uvicorn worker / Streamlit process on the box
+draws from the same quota, and calls are admitted *before* they hit a 429.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from sqlite_store import SQLiteStore
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB", os.path.join(BASE_DIR, ".rate_limits.sqlite3"))
+
+# Quotas per model. 0 disables that bucket. Override with GEMINI_RATE_LIMITS, e.g.
+# '{"gemini-3-flash-preview": {"rpm": 10, "tpm": 250000}}'
+DEFAULT_LIMITS = {
+    "gemini-3-flash-preview": {"rpm": 60, "tpm": 1000000},
+    "gemini-2.0-flash": {"rpm": 200, "tpm": 1000000},
+}
+FALLBACK_LIMITS = {"rpm": 60, "tpm": 1000000}
+
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_CAP_SECONDS = 60.0
+
+# Rough chars-per-token for admission estimates (reconciled after the call)
+CHARS_PER_TOKEN = 4
+
+
+def _load_limits():
+    limits = {model: dict(v) for model, v in DEFAULT_LIMITS.items()}
+    raw = os.environ.get("GEMINI_RATE_LIMITS")
+    if raw:
+        try:
+            for model, v in json.loads(raw).items():
+                limits.setdefault(model, dict(FALLBACK_LIMITS)).update(v)
+        except Exception as e:
+            print(f"WARNING: Ignoring invalid GEMINI_RATE_LIMITS: {e}")
+    return limits
+
+
+def estimate_tokens(contents, config=None):
+    """Cheap token estimate for a generate_content call (prompt + system instruction)."""
+    chars = len(contents) if isinstance(contents, str) else len(str(contents))
+    system_instruction = getattr(config, "system_instruction", None)
+    if system_instruction:
+        chars += len(str(system_instruction))
+    return max(1, chars // CHARS_PER_TOKEN)
+
+
+def retry_after_hint(error):
+    """Seconds the server asked us to wait, from a Retry-After header or a RetryInfo retryDelay."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = re.search(r"retry_?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt, hint=None):
+    """Jittered exponential backoff (equal jitter), never shorter than the server's hint."""
+    ceiling = min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    if hint is not None:
+        delay = max(delay, hint + random.uniform(0, 1))
+    return delay
+
+
+class RateLimiter:
+    """Token buckets per (model, kind) persisted in SQLite."""
+
+    def __init__(self, db_path=RATE_LIMIT_DB, limits=None, enabled=True):
+        self.db_path = db_path
+        self.enabled = enabled
+        self.limits = limits if limits is not None else _load_limits()
+        self._stats_lock = threading.Lock()
+        self.stats = {"admitted": 0, "waited": 0, "wait_seconds": 0.0, "throttled": 0}
+        self._db = SQLiteStore(db_path, schema=[
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " model TEXT, kind TEXT, tokens REAL, updated REAL,"
+            " PRIMARY KEY (model, kind))",
+            "CREATE TABLE IF NOT EXISTS cooldowns (model TEXT PRIMARY KEY, until REAL)",
+        ])
+
+    def _rates(self, model):
+        limits = self.limits.get(model, FALLBACK_LIMITS)
+        return {"rpm": limits.get("rpm", 0), "tpm": limits.get("tpm", 0)}
+
+    def _try_take(self, conn, model, needs):
+        """One admission attempt inside a write transaction. Returns seconds to wait (0 = admitted)."""
+        now = time.time()
+        row = conn.execute("SELECT until FROM cooldowns WHERE model = ?", (model,)).fetchone()
+        if row and row[0] > now:
+            return row[0] - now
+
+        levels = {}
+        wait_for = 0.0
+        for kind, capacity in self._rates(model).items():
+            if not capacity:
+                continue
+            need = min(needs[kind], capacity)
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE model = ? AND kind = ?", (model, kind)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * capacity / 60.0)
+            levels[kind] = tokens - need
+            if tokens < need:
+                wait_for = max(wait_for, (need - tokens) * 60.0 / capacity)
+
+        if wait_for > 0:
+            return wait_for
+        for kind, remaining in levels.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (model, kind, tokens, updated) VALUES (?, ?, ?, ?)",
+                (model, kind, remaining, now),
+            )
+        return 0.0
+
+    def acquire(self, model, tokens=1):
+        """Blocks until one request and `tokens` tokens are available for `model`."""
+        if not self.enabled:
+            return
+        needs = {"rpm": 1, "tpm": tokens}
+        conn = self._db.connect()
+        waited = 0.0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                wait_for = self._try_take(conn, model, needs)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if wait_for <= 0:
+                break
+            # Small jitter so waiting callers don't all wake in the same instant
+            sleep_for = wait_for + random.uniform(0, 0.05 * wait_for + 0.01)
+            time.sleep(sleep_for)
+            waited += sleep_for
+        with self._stats_lock:
+            self.stats["admitted"] += 1
+            if waited:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] += waited
+
+    def adjust_tokens(self, model, delta):
+        """Reconcile the token bucket once real usage is known (positive delta = used more)."""
+        capacity = self._rates(model)["tpm"]
+        if not self.enabled or not capacity or not delta:
+            return
+        conn = self._db.connect()
+        conn.execute(
+            "UPDATE buckets SET tokens = MAX(-?, MIN(?, tokens - ?)) WHERE model = ? AND kind = 'tpm'",
+            (capacity, capacity, delta, model),
+        )
+
+    def throttle(self, model, seconds):
+        """Called on a 429: pause every process for `seconds` and drain the request bucket."""
+        if not self.enabled:
+            return
+        until = time.time() + seconds
+        conn = self._db.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cooldowns (model, until) VALUES (?, ?)"
+                " ON CONFLICT(model) DO UPDATE SET until = MAX(until, excluded.until)",
+                (model, until),
+            )
+            conn.execute(
+                "UPDATE buckets SET tokens = 0, updated = ? WHERE model = ? AND kind = 'rpm'",
+                (until, model),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._stats_lock:
+            self.stats["throttled"] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["limits"] = self.limits
+        stats["enabled"] = self.enabled
+        return stats
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Process-wide limiter (state itself is shared across processes via SQLite)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            # Replayed calls never reach Gemini, so they don't spend quota
+            _limiter = RateLimiter(enabled=os.environ.get("LLM_MODE", "live").lower() != "replay")
+        return _limiter
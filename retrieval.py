@@ -0,0 +1,123 @@
+"""
+Retrieval helpers shared by the API and the Streamlit app.
+
+pack_exemplars() turns a ranked list of candidate chunks into the exemplar
+block for the generation prompt under a fixed token budget, so prompt size
+(and latency) no longer swings with chunk length. reciprocal_rank_fusion()
+merges the lexical and dense rankings for hybrid retrieval.
+"""
+import hashlib
+import os
+
+from rate_limiter import CHARS_PER_TOKEN
+
+EXEMPLAR_SEPARATOR = "\n\n---EXEMPLAR---\n\n"
+EXEMPLAR_TOKEN_BUDGET = int(os.environ.get("EXEMPLAR_TOKEN_BUDGET", "1200"))
+EXEMPLARS_PER_SOURCE = int(os.environ.get("EXEMPLARS_PER_SOURCE", "1"))
+
+# Matches the splitter's chunk_overlap in ingest_essays.split_text
+CHUNK_OVERLAP_CHARS = 200
+
+# Reciprocal-rank fusion constant (the usual 60 from Cormack et al.)
+RRF_K = 60
+
+
+def _text_fingerprint(text):
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _overlaps(a, b):
+    """True when two chunks are neighbours from the splitter (shared 200-char overlap) or nested."""
+    meta_a, meta_b = a.metadata or {}, b.metadata or {}
+    if meta_a.get("source") == meta_b.get("source"):
+        start_a, start_b = meta_a.get("start_index"), meta_b.get("start_index")
+        if start_a is not None and start_b is not None:
+            end_a = start_a + len(a.page_content)
+            end_b = start_b + len(b.page_content)
+            return start_a < end_b and start_b < end_a
+    probe = CHUNK_OVERLAP_CHARS // 2
+    text_a, text_b = a.page_content, b.page_content
+    return (len(text_a) >= probe and text_a[-probe:] in text_b) or \
+           (len(text_b) >= probe and text_b[-probe:] in text_a)
+
+
+def _truncate_at_sentence(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    return cut[:end + 1] if end > max_chars * 0.5 else cut
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuses ranked id lists: score(id) = sum of 1 / (k + rank). Returns ids, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+def pack_exemplars(candidates, budget_tokens=None, max_chunks=None, per_source=None):
+    """
+    Greedily fills a token budget with the highest-ranked candidate chunks.
+
+    candidates: Documents in rank order (best first).
+    Skips exact/near-duplicate text, chunks overlapping an already chosen
+    chunk, and chunks beyond `per_source` from the same source file.
+    Returns (exemplar_text, info) where info has chunk/char/token counts.
+    """
+    budget_tokens = EXEMPLAR_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    per_source = EXEMPLARS_PER_SOURCE if per_source is None else per_source
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+
+    chosen = []
+    seen_text = set()
+    per_source_count = {}
+    used_chars = 0
+    skipped = {"duplicate": 0, "overlap": 0, "same_source": 0, "over_budget": 0}
+
+    for doc in candidates:
+        if max_chunks is not None and len(chosen) >= max_chunks:
+            break
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        fingerprint = _text_fingerprint(text)
+        if fingerprint in seen_text:
+            skipped["duplicate"] += 1
+            continue
+        source = (doc.metadata or {}).get("source")
+        if source is not None and per_source_count.get(source, 0) >= per_source:
+            skipped["same_source"] += 1
+            continue
+        if any(_overlaps(doc, other) for other, _ in chosen):
+            skipped["overlap"] += 1
+            continue
+
+        cost = len(text) + (len(EXEMPLAR_SEPARATOR) if chosen else 0)
+        if used_chars + cost > budget_chars:
+            if chosen:
+                skipped["over_budget"] += 1
+                continue
+            # Never return nothing: trim the best chunk to the budget
+            text = _truncate_at_sentence(text, budget_chars)
+            cost = len(text)
+
+        chosen.append((doc, text))
+        seen_text.add(fingerprint)
+        if source is not None:
+            per_source_count[source] = per_source_count.get(source, 0) + 1
+        used_chars += cost
+
+    exemplar_text = EXEMPLAR_SEPARATOR.join(text for _, text in chosen)
+    info = {
+        "chunks": len(chosen),
+        "chars": len(exemplar_text),
+        "tokens_est": len(exemplar_text) // CHARS_PER_TOKEN,
+        "budget_tokens": budget_tokens,
+        "candidates": len(candidates),
+        "skipped": skipped,
+        "sources": [(doc.metadata or {}).get("source") for doc, _ in chosen],
+    }
+    return exemplar_text, info
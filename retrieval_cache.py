@@ -0,0 +1,127 @@
+"""
+Shared cache of retrieval results, invalidated by collection version.
+
+The corpus only changes on ingest, yet /generate and app.py run a
+similarity search on every request. Results are cached under a key of
+(normalised query, k, filter, retrieval settings, collection version). The
+version is a counter in the same SQLite file: ingest_essay and reset_brain
+bump it, so entries written before a change can never be served again, and
+bumping also deletes them. Because storage is SQLite, the API and Streamlit
+processes share both the entries and the version.
+
+Size is bounded by RETRIEVAL_CACHE_MAX_MB / RETRIEVAL_CACHE_MAX_ENTRIES with
+LRU eviction. RETRIEVAL_CACHE=off disables it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlite_store import SQLiteStore, evict_lru
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.environ.get("RETRIEVAL_CACHE_DB", os.path.join(BASE_DIR, ".retrieval_cache.sqlite3"))
+CACHE_ENABLED = os.environ.get("RETRIEVAL_CACHE", "on").lower() == "on"
+CACHE_MAX_BYTES = int(float(os.environ.get("RETRIEVAL_CACHE_MAX_MB", "16")) * 1024 * 1024)
+CACHE_MAX_ENTRIES = int(os.environ.get("RETRIEVAL_CACHE_MAX_ENTRIES", "2000"))
+
+
+def normalize_query(query):
+    """MiniLM's tokenizer is uncased and BM25 lowercases, so case and spacing don't change results."""
+    return " ".join(query.lower().split())
+
+
+class RetrievalCache:
+    def __init__(self, db_path=CACHE_DB, enabled=CACHE_ENABLED, max_bytes=CACHE_MAX_BYTES,
+                 max_entries=CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._db = SQLiteStore(db_path, schema=[
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)",
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('collection_version', 0)",
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, version INTEGER, value TEXT, size INTEGER, last_access REAL)",
+            "CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)",
+        ])
+
+    def _count(self, stat, n=1):
+        with self._stats_lock:
+            self.stats[stat] += n
+
+    def version(self):
+        return self._db.connect().execute("SELECT value FROM meta WHERE name = 'collection_version'").fetchone()[0]
+
+    def bump_version(self, reason=""):
+        """Marks the collection as changed: every cached result becomes stale and is dropped."""
+        conn = self._db.connect()
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'collection_version'")
+        version = self.version()
+        conn.execute("DELETE FROM entries WHERE version < ?", (version,))
+        self._count("invalidations")
+        print(f"DEBUG: Collection version -> {version}{f' ({reason})' if reason else ''}")
+        return version
+
+    def make_key(self, query, k, filter=None, **settings):
+        """(key, version) for a search; `settings` are whatever else shapes the results."""
+        version = self.version()
+        payload = json.dumps({"query": normalize_query(query), "k": k, "filter": filter,
+                              "settings": settings, "version": version}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest(), version
+
+    def get(self, key):
+        """Cached JSON value for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+        conn = self._db.connect()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, key, version, value):
+        if not self.enabled:
+            return
+        data = json.dumps(value)
+        conn = self._db.connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, version, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, version, data, len(data), time.time()),
+        )
+        self._count("stores")
+        evicted = evict_lru(conn, "entries", self.max_entries, self.max_bytes)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["enabled"] = self.enabled
+        conn = self._db.connect()
+        stats["entries"], stats["bytes"] = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        stats["collection_version"] = self.version()
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache handle (storage and version are shared across processes)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RetrievalCache()
+        return _cache
@@ -0,0 +1,94 @@
+"""
+In-process single-flight coalescing.
+
+When several callers ask for the same work at once (duplicate browser tabs,
+client retries, two admins clicking "analyze"), only the first runs it; the
+rest block until it finishes and receive a copy of the same result.
+"""
+import copy
+import hashlib
+import threading
+
+
+def normalize(text):
+    """Collapse whitespace so cosmetic differences don't split identical requests."""
+    return " ".join(str(text).split())
+
+
+def request_key(*parts):
+    """Stable key for a request built from its normalized parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(normalize(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) once per key at a time; concurrent duplicates share its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Callers mutate results (timings, edits); give each its own copy
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            self._finish(key, call)
+            raise
+        # Snapshot for waiters only; the key is gone so nobody else can join now
+        if self._finish(key, call):
+            call.result = copy.deepcopy(result)
+        call.done.set()
+        return result
+
+    def _finish(self, key, call):
+        """Retires the key. Returns the number of waiters; wakes them at once on error."""
+        with self._lock:
+            self._calls.pop(key, None)
+            waiters = call.waiters
+        if call.error is not None:
+            call.done.set()
+        return waiters
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+_flights = SingleFlight()
+
+
+def get_single_flight():
+    return _flights
@@ -0,0 +1,58 @@
+"""
+Shared SQLite plumbing for the on-disk stores (generation, retrieval and
+embedding caches, rate limiter).
+
+Each store is one SQLite file shared by the API and Streamlit processes.
+SQLiteStore hands out one autocommit connection per thread (sqlite3
+connections must not cross threads) and creates the schema in WAL mode.
+evict_lru() trims a table to its size/count limits by last_access.
+"""
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    def __init__(self, db_path, schema=()):
+        """`schema`: statements run once on open (CREATE TABLE IF NOT EXISTS ...)."""
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in schema:
+            conn.execute(statement)
+
+    def connect(self):
+        """This thread's connection to the store."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+
+def evict_lru(conn, table, max_entries, max_bytes=None):
+    """
+    Drops least-recently-used rows of `table` (columns key, last_access and,
+    when max_bytes is given, size) until both limits hold. Returns the number
+    of rows evicted.
+    """
+    if max_bytes is None:
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        if count <= max_entries:
+            return 0
+        conn.execute(
+            f"DELETE FROM {table} WHERE key IN (SELECT key FROM {table} ORDER BY last_access LIMIT ?)",
+            (count - max_entries,),
+        )
+        return count - max_entries
+    count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {table}").fetchone()
+    evicted = 0
+    while count > max_entries or total > max_bytes:
+        row = conn.execute(f"SELECT key, size FROM {table} ORDER BY last_access LIMIT 1").fetchone()
+        if row is None:
+            break
+        conn.execute(f"DELETE FROM {table} WHERE key = ?", (row[0],))
+        count -= 1
+        total -= row[1]
+        evicted += 1
+    return evicted
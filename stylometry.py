@@ -0,0 +1,97 @@
+"""
+Local stylometric similarity between drafts and their exemplars.
+
+style_similarity() scores how closely each draft matches the exemplars'
+writing style, with no API calls:
+  semantic        - cosine of MiniLM embeddings (draft vs exemplar centroid),
+                    using the embedding model retrieval already loaded
+  sentence_length - overlap of the words-per-sentence histograms
+  punctuation     - cosine of per-character punctuation rates
+  function_words  - cosine of function-word frequencies
+All drafts are featurised into one matrix and scored in a single NumPy pass.
+"""
+import re
+
+import numpy as np
+
+SENTENCE_BINS = [0, 6, 11, 16, 21, 26, 36, 10_000]  # words per sentence: 1-5, 6-10, ... 36+
+PUNCTUATION = [",", ";", ":", "-", "—", "(", "!", "?", "'", '"', "…", "."]
+FUNCTION_WORDS = [
+    "the", "a", "an", "and", "but", "or", "so", "because", "if", "when", "while", "although", "though",
+    "of", "in", "on", "at", "to", "for", "with", "by", "from", "about", "into", "than", "as",
+    "i", "my", "me", "we", "it", "this", "that", "these", "those", "there", "which", "who",
+    "is", "was", "were", "be", "been", "have", "had", "not", "no", "just", "very", "also", "more",
+]
+WEIGHTS = {"semantic": 0.4, "sentence_length": 0.2, "punctuation": 0.2, "function_words": 0.2}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[A-Za-z][A-Za-z'’]*")
+_FUNCTION_INDEX = {word: i for i, word in enumerate(FUNCTION_WORDS)}
+
+
+def _features(text):
+    """(sentence-length histogram, punctuation rates, function-word frequencies) for one text."""
+    sentences = [s for s in _SENTENCE_END.split(text.strip()) if s]
+    lengths = [len(_WORD.findall(s)) for s in sentences] or [0]
+    histogram, _ = np.histogram(lengths, bins=SENTENCE_BINS)
+
+    chars = max(1, len(text))
+    punctuation = np.array([text.count(p) / chars for p in PUNCTUATION])
+
+    words = [w.lower() for w in _WORD.findall(text)]
+    function_words = np.zeros(len(FUNCTION_WORDS))
+    for word in words:
+        index = _FUNCTION_INDEX.get(word)
+        if index is not None:
+            function_words[index] += 1
+    function_words /= max(1, len(words))
+    return histogram.astype(float), punctuation, function_words
+
+
+def _matrix(texts):
+    rows = [_features(t) for t in texts]
+    return [np.vstack([row[i] for row in rows]) for i in range(3)]
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _cosine_to(matrix, vector):
+    return _normalize_rows(matrix) @ _normalize_rows(vector[None, :])[0]
+
+
+def style_similarity(drafts, exemplars, embeddings=None):
+    """
+    Scores each draft against the exemplars. `embeddings` is a LangChain
+    embeddings object (e.g. backend.get_embedding_function()); without it the
+    semantic component is skipped and the other weights are rescaled.
+    Returns {"score": array, <component>: array, ...}, one entry per draft, 0..1.
+    """
+    exemplars = [e for e in exemplars if e and e.strip()]
+    if not drafts or not exemplars:
+        return {"score": np.zeros(len(drafts))}
+
+    draft_hist, draft_punct, draft_func = _matrix(drafts)
+    ex_hist, ex_punct, ex_func = _matrix(["\n".join(exemplars)])
+
+    # Histogram intersection of the normalised sentence-length distributions
+    draft_dist = draft_hist / np.maximum(draft_hist.sum(axis=1, keepdims=True), 1)
+    ex_dist = ex_hist[0] / max(ex_hist[0].sum(), 1)
+    components = {
+        "sentence_length": np.minimum(draft_dist, ex_dist).sum(axis=1),
+        "punctuation": _cosine_to(draft_punct, ex_punct[0]),
+        "function_words": _cosine_to(draft_func, ex_func[0]),
+    }
+
+    if embeddings is not None:
+        vectors = np.asarray(embeddings.embed_documents(list(drafts) + exemplars), dtype=np.float32)
+        centroid = vectors[len(drafts):].mean(axis=0)
+        components["semantic"] = np.clip(_cosine_to(vectors[:len(drafts)], centroid), 0, 1)
+
+    total_weight = sum(WEIGHTS[name] for name in components)
+    score = sum(WEIGHTS[name] * values for name, values in components.items()) / total_weight
+    result = {"score": np.round(score, 4)}
+    result.update({name: np.round(values, 4) for name, values in components.items()})
+    return result